@@ -0,0 +1,226 @@
+# Benchmarks over the bundled example contracts.
+#
+#   python tests/bench.py [--scale 1.0] [--output results.json] [--baseline tests/bench_baseline.json]
+#                         [--threshold 0.2] [--save-baseline] [--unsigned] [--lazy-state]
+#                         [--timeout seconds] [name ...]
+#
+# Each benchmark runs in its own forked process so its peak RSS can be measured. Results are compared against
+# the baseline file when it exists, and the script exits with status 1 when any metric regressed by more than
+# the threshold (a fraction of the baseline value). Record a baseline with --save-baseline.
+
+import argparse
+import json
+import multiprocessing
+import os
+import Queue
+import resource
+import sys
+from timeit import default_timer
+
+from sim import Key, Simulator, compile_serpent, compile_lll, compile_mutan
+
+ALICE = Key('cow')
+BOB = Key('cat')
+FOUNDERS = {ALICE.address: 10**24, BOB.address: 10**24}
+
+# metric -> True when higher is better
+METRICS = {'deploy_latency': False, 'tx_per_second': True, 'gas_per_call': False, 'peak_rss_kb': False}
+
+BENCHMARKS = []
+
+
+def benchmark(name, contract, compiler=compile_serpent, calls=1000, gas=Simulator.STARTGAS, setup=None):
+    def register(fn):
+        BENCHMARKS.append((name, contract, compiler, calls, gas, setup, fn))
+        return fn
+    return register
+
+
+def address(i):
+    return '%040x' % (i + 1)
+
+
+@benchmark('returnten', 'examples/returnten.se')
+def returnten(sim, contract, i):
+    return ALICE, []
+
+
+@benchmark('hash', 'examples/hash.se')
+def hash_(sim, contract, i):
+    return ALICE, ['hash', 'grant to bob']
+
+
+@benchmark('namecoin', 'examples/namecoin.se')
+def namecoin(sim, contract, i):
+    return ALICE, ['name%d.bit' % i, '127.0.0.1']
+
+
+@benchmark('datafeed', 'examples/datafeed.se')
+def datafeed(sim, contract, i):
+    return ALICE, ['key%d' % i, i]
+
+
+@benchmark('keyval_publisher', 'examples/keyval_publisher.lll', compiler=compile_lll)
+def keyval_publisher(sim, contract, i):
+    return ALICE, ['key%d' % i, i]
+
+
+@benchmark('subcurrency', 'examples/subcurrency.se', calls=10000)
+def subcurrency(sim, contract, i):
+    return ALICE, [address(i % 100), 1]
+
+
+@benchmark('subcurrency_mutan', 'examples/subcurrency.mu', compiler=compile_mutan, calls=10000)
+def subcurrency_mutan(sim, contract, i):
+    return ALICE, [address(i % 100), 1]
+
+
+@benchmark('mutuala_pay', 'examples/mutuala.se', calls=1000, gas=100000)
+def mutuala_pay(sim, contract, i):
+    return ALICE, ['pay', address(i % 100), 1000]
+
+
+def mutuala_accounts(sim, contract):
+    for n in range(50):
+        sim.tx(ALICE, contract, 0, ['pay', address(n), 10**6], gas=100000)
+
+
+@benchmark('mutuala_tick', 'examples/mutuala.se', calls=10, gas=10**6, setup=mutuala_accounts)
+def mutuala_tick(sim, contract, i):
+    sim.genesis.timestamp += 86400
+    return ALICE, ['tick']
+
+
+def mutuala_proposal(sim, contract):
+    sim.tx(ALICE, contract, 0, ['pay', BOB.address, 1000], gas=100000)
+    sim.genesis.timestamp += 30 * 86400
+    sim.tx(ALICE, contract, 0, ['tick'], gas=100000)
+    sim.tx(ALICE, contract, 0, ['propose', 'grant to bob', BOB.address, 5000], gas=100000)
+
+
+@benchmark('mutuala_vote', 'examples/mutuala.se', calls=1000, gas=100000, setup=mutuala_proposal)
+def mutuala_vote(sim, contract, i):
+    return ALICE, ['vote', 'grant to bob', 1]
+
+
+def run(filename, compiler, calls, gas, setup, fn, options):
+    code = compiler(filename)
+    sim = Simulator(FOUNDERS, **options)
+
+    start = default_timer()
+    contract = sim.load_contract(ALICE, code, gas=100000)
+    deploy_latency = default_timer() - start
+
+    if setup is not None:
+        setup(sim, contract)
+
+    gas_used = sim.genesis.gas_used
+    start = default_timer()
+    for i in range(calls):
+        frm, data = fn(sim, contract, i)
+        sim.tx(frm, contract, 0, data, gas=gas)
+    elapsed = default_timer() - start
+
+    return {'deploy_latency': deploy_latency,
+            'tx_per_second': calls / elapsed,
+            'gas_per_call': float(sim.genesis.gas_used - gas_used) / calls,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+# Runs fn(*args) in a forked process and returns its result, or {'error': ...} when it raised, died without
+# a result (e.g. killed for running out of memory) or ran longer than timeout seconds
+def run_isolated(fn, args, timeout=None):
+    queue = multiprocessing.Queue()
+
+    def target():
+        try:
+            queue.put(fn(*args))
+        except Exception as e:
+            queue.put({'error': repr(e)})
+
+    process = multiprocessing.Process(target=target)
+    process.start()
+    deadline = None if timeout is None else default_timer() + timeout
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except Queue.Empty:
+            pass
+        if not process.is_alive():
+            try:
+                result = queue.get(timeout=1)  # put just before it exited
+            except Queue.Empty:
+                result = {'error': 'process exited with code %r' % process.exitcode}
+            break
+        if deadline is not None and default_timer() > deadline:
+            process.terminate()
+            result = {'error': 'timed out after %g s' % timeout}
+            break
+    process.join()
+    return result
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, metrics in sorted(results.items()):
+        for metric, higher_is_better in sorted(METRICS.items()):
+            if metric not in metrics or metric not in baseline.get(name, {}):
+                continue
+            old, new = baseline[name][metric], metrics[metric]
+            if not old:
+                continue
+            change = (new - old) / float(old)
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((name, metric, old, new, change))
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the example contracts')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the number of calls')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(__file__), 'bench_baseline.json'))
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--unsigned', action='store_true')
+    parser.add_argument('--lazy-state', action='store_true')
+    parser.add_argument('--timeout', type=float, help='seconds a benchmark may run before it is stopped')
+    args = parser.parse_args(argv)
+    options = {'signed': not args.unsigned, 'lazy_state': args.lazy_state}
+
+    results = {}
+    for (name, filename, compiler, calls, gas, setup, fn) in BENCHMARKS:
+        if args.names and name not in args.names:
+            continue
+        result = run_isolated(run, (filename, compiler, max(int(calls * args.scale), 1), gas, setup, fn, options),
+                              args.timeout)
+        results[name] = result
+        if 'error' in result:
+            print("%-20s skipped: %s" % (name, result['error']))
+        else:
+            print("%-20s deploy %8.2f ms  %9.1f tx/s  %9.1f gas/call  %8d KB" % (
+                name, result['deploy_latency'] * 1000, result['tx_per_second'], result['gas_per_call'],
+                result['peak_rss_kb']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(dict((k, v) for (k, v) in results.items() if 'error' not in v), f, indent=2, sort_keys=True)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    for (name, metric, old, new, change) in regressions:
+        print("REGRESSION %s %s: %.4g -> %.4g (%+.1f%%)" % (name, metric, old, new, change * 100))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
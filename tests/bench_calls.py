@@ -0,0 +1,44 @@
+# Compares encoding calldata and decoding results with encode_datalist/decode_datalist against call templates
+# (Simulator.method), alone and as part of a transaction.
+#
+#   python tests/bench_calls.py [number of calls]
+
+import sys
+import time
+
+from serpent import encode_datalist, decode_datalist
+
+from call_template import LazyResult
+from sim import Key, Simulator, compile_serpent
+
+ALICE = Key('cow')
+BOB = Key('cat')
+
+
+def per_second(fn, n):
+    start = time.time()
+    for i in range(n):
+        fn(i)
+    return n / (time.time() - start)
+
+
+def main(n):
+    sim = Simulator({ALICE.address: 10**24}, signed=False)
+    contract = sim.load_contract(ALICE, compile_serpent('examples/mutuala.se'), gas=100000)
+    pay = sim.method(contract, 'pay', ['address', 'int'], gas=100000)
+    result = encode_datalist([0, 12345])
+
+    rows = [
+        ('encode', per_second(lambda i: encode_datalist(['pay', BOB.address, i]), n * 10),
+         per_second(lambda i: pay.encode(BOB.address, i), n * 10)),
+        ('decode', per_second(lambda i: decode_datalist(result)[1], n * 10),
+         per_second(lambda i: LazyResult(result)[1], n * 10)),
+        ('tx', per_second(lambda i: sim.tx(ALICE, contract, 0, ['pay', BOB.address, 1], gas=100000), n),
+         per_second(lambda i: pay(ALICE, BOB.address, 1), n)),
+    ]
+    for name, datalist, template in rows:
+        print("%-8s datalist %10.1f/s  template %10.1f/s (%.2fx)" % (name, datalist, template, template / datalist))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
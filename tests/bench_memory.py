@@ -0,0 +1,33 @@
+# Memory per storage slot with and without Simulator(compact_storage=True), from memory_report(): the
+# in-memory database entries holding the state, the storage view of the contract, and their total, next to
+# the size of the storage trie itself. The compact mode only changes how the view holds the slots, so the
+# database and trie columns are the same in both modes.
+#
+#   python tests/bench_memory.py [number of slots ...]
+
+import sys
+
+from sim import Key, Simulator
+
+ALICE = Key('cow')
+CONTRACT = '%040x' % 1
+
+
+def main(counts):
+    print("%10s %8s %14s %14s %14s %14s" % ('slots', 'compact', 'db B/slot', 'view B/slot', 'total B/slot',
+                                            'trie B/slot'))
+    for n in counts:
+        for compact_storage in (False, True):
+            sim = Simulator({ALICE.address: 10**18}, compact_storage=compact_storage)
+            # keys spread like mutuala's account map, values of a few words' worth of bits
+            sim.load_state({CONTRACT: {'storage': dict((2**161 + i * 3, 10**12 + i) for i in range(n))}})
+            len(sim.storage(CONTRACT))
+            report = sim.memory_report()
+            memory = report['memory']
+            print("%10d %8s %14.1f %14.1f %14.1f %14.1f" % (
+                n, 'yes' if compact_storage else 'no', float(memory['db']) / n, float(memory['views']) / n,
+                float(memory['db'] + memory['views']) / n, float(report['storage']['bytes']) / n))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,32 @@
+# Compares transaction throughput with and without ECDSA signing.
+#
+#   python tests/bench_signing.py [number of transactions]
+
+import sys
+import time
+
+from sim import Key, Simulator, compile_serpent
+
+ALICE = Key('cow')
+BOB = Key('cat')
+
+
+def tx_per_second(code, signed, n):
+    sim = Simulator({ALICE.address: 10**18}, signed=signed)
+    contract = sim.load_contract(ALICE, code)
+    start = time.time()
+    for _ in range(n):
+        assert sim.tx(ALICE, contract, 0, [BOB.address, 1]) == [1]
+    return n / (time.time() - start)
+
+
+def main(n):
+    code = compile_serpent('examples/subcurrency.se')
+    signed = tx_per_second(code, True, n)
+    unsigned = tx_per_second(code, False, n)
+    print("signed:   %8.1f tx/s" % signed)
+    print("unsigned: %8.1f tx/s (%.2fx)" % (unsigned, unsigned / signed))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
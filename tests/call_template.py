@@ -0,0 +1,100 @@
+import struct
+
+from serpent import encode_datalist
+
+WORD = 32
+MASK = 2**64 - 1
+WORDS = struct.Struct('>4Q')
+
+
+def pack_int(buf, offset, value):
+    value %= 2**256
+    WORDS.pack_into(buf, offset, value >> 192, (value >> 128) & MASK, (value >> 64) & MASK, value & MASK)
+
+
+# Slice assignment of a different length would resize buf instead of failing, so lengths are checked first
+def pack_address(buf, offset, value):
+    if isinstance(value, (int, long)):
+        pack_int(buf, offset, value)
+        return
+    if len(value) != 40:
+        raise ValueError("expected a 40 character hex address, got %r" % (value,))
+    buf[offset:offset + 12] = '\0' * 12
+    buf[offset + 12:offset + WORD] = value.decode('hex')
+
+
+def pack_value(buf, offset, value):
+    word = encode_datalist([value])
+    if len(word) != WORD:
+        raise ValueError("%r does not encode to a single word" % (value,))
+    buf[offset:offset + WORD] = word
+
+
+PACKERS = {'int': pack_int, 'address': pack_address, 'value': pack_value}
+
+
+# Return data of a call, decoded a word at a time when accessed, straight from the output string. Compares
+# equal to the list decode_datalist would return.
+class LazyResult(object):
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data) // WORD
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        a, b, c, d = WORDS.unpack_from(self.data, index * WORD)
+        return (a << 192) | (b << 128) | (c << 64) | d
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+# A call shape such as ["pay", address, amount]: the calldata of the constant leading values (e.g. the method
+# name, or nothing with name=None) is encoded once, and each call only packs its arguments into the words
+# after it in a preallocated buffer. arg_types are 'int', 'address' (hex string or int) or 'value' (anything
+# encode_datalist takes that encodes to one word, e.g. a string of up to 32 bytes). Arguments are packed into a
+# copy of the buffer, so one template can be used from several threads; encode returns that copy, a bytearray,
+# which the Simulator sends as is. Results are LazyResults. See Simulator.method.
+class CallTemplate(object):
+
+    def __init__(self, sim, contract, name, arg_types, value, gas):
+        self.sim = sim
+        self.contract = contract
+        self.packers = [PACKERS[arg_type] for arg_type in arg_types]
+        self.prefix = encode_datalist([name] if name is not None else [])
+        self.buf = bytearray(self.prefix + '\0' * (WORD * len(arg_types)))
+        self.value = value
+        self.gas = gas
+
+    def encode(self, *args):
+        assert len(args) == len(self.packers), "expected %d arguments" % len(self.packers)
+        buf = bytearray(self.buf)
+        offset = len(self.prefix)
+        for pack, arg in zip(self.packers, args):
+            pack(buf, offset, arg)
+            offset += WORD
+        return buf
+
+    def __call__(self, frm, *args):
+        return LazyResult(self.sim.tx_raw(frm, self.contract, self.value, self.encode(*args), self.gas))
+
+    def call(self, frm, *args):
+        return LazyResult(self.sim.call_raw(frm, self.contract, self.encode(*args), self.value, self.gas))
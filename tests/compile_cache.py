@@ -0,0 +1,149 @@
+import hashlib
+import os
+import tempfile
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'evm-sim', 'compiled')
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+def fingerprint(path):
+    st = os.stat(path)
+    return '%s:%d:%d' % (path, st.st_size, int(st.st_mtime))
+
+
+def which(cmd):
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        candidate = os.path.join(path, cmd)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return os.path.realpath(candidate)
+    return None
+
+
+# Compiler output keyed by a hash of compiler, compiler version, arguments and source. Entries are renamed into
+# place so concurrent writers (xdist workers) never see partial files; hits touch the mtime so eviction is LRU.
+# The size of the cache is only measured on the first put; after that it is counted up as entries are written,
+# and the directory is walked again only when the count exceeds max_size. Entries written by other processes are
+# not counted until then.
+class CompileCache(object):
+
+    def __init__(self, path=DEFAULT_PATH, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total = None  # bytes in the cache as far as this process knows
+        self._versions = {}
+
+    def compiler_version(self, cmd):
+        # fingerprint the binary instead of spawning `cmd --version`, which would cost the very subprocess we try to avoid
+        if cmd not in self._versions:
+            binary = which(cmd)
+            self._versions[cmd] = cmd if binary is None else fingerprint(binary)
+        return self._versions[cmd]
+
+    # version identifies the compiler when it is not the cmd binary, e.g. a compiler module used in-process
+    def key(self, cmd, args, source, version=None):
+        h = hashlib.sha256()
+        for part in [cmd, version or self.compiler_version(cmd)] + list(args):
+            h.update(part.encode('utf-8') if not isinstance(part, bytes) else part)
+            h.update(b'\0')
+        h.update(source)
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        filename = self.entry_path(key)
+        try:
+            with open(filename, 'rb') as f:
+                code = f.read()
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return code
+
+    def put(self, key, code):
+        filename = self.entry_path(key)
+        directory = os.path.dirname(filename)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(code)
+            os.rename(tmp, filename)
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        if self.total is None:
+            self.total = self.size()
+        else:
+            self.total += len(code)
+        if self.total > self.max_size:
+            self.evict()
+
+    def entries(self):
+        result = []
+        if not os.path.isdir(self.path):
+            return result
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.startswith('.tmp-'):
+                    continue
+                filename = os.path.join(root, name)
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    continue  # removed by a concurrent evict
+                result.append((st.st_mtime, st.st_size, filename))
+        return result
+
+    def size(self):
+        return sum(size for (_, size, _) in self.entries())
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, filename) in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(filename)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+        self.total = total
+
+    def clear(self):
+        for (_, _, filename) in self.entries():
+            try:
+                os.unlink(filename)
+            except OSError:
+                pass
+        self.total = 0
+
+    def compile(self, cmd, args, filename, compiler, version=None):
+        with open(filename, 'rb') as f:
+            source = f.read()
+        key = self.key(cmd, args, source, version)
+        code = self.get(key)
+        if code is None:
+            code = compiler(cmd, args, filename)
+            self.put(key, code)
+        return code
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
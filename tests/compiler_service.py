@@ -0,0 +1,86 @@
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import threading
+
+
+def compile_entry(args):
+    compiler, path = args
+    mtime = os.path.getmtime(path)
+    try:
+        return (mtime, compiler(path), None)
+    except Exception as e:
+        return (mtime, None, e)
+
+
+# Keeps compiled bytecode in memory for the life of the process, keyed by compiler and path and checked against
+# the file's mtime. warm_up() compiles a list of files (or a whole directory) concurrently, so tests asking for
+# a contract later find its bytecode ready. Compilation errors are kept too and raised again for whoever asks for
+# that file. Compilers that run a separate program are run on threads; those in gil_bound, which compile inside
+# this process without releasing the GIL (e.g. the serpent module), are run in a pool of forked processes
+# instead, and must be module level functions.
+class CompilerService(object):
+
+    def __init__(self, compilers, gil_bound=()):
+        self.compilers = compilers  # extension -> compile function
+        self.gil_bound = set(gil_bound)
+        self.compiled = {}
+        self.lock = threading.Lock()
+
+    def compiler_for(self, filename):
+        return self.compilers[os.path.splitext(filename)[1]]
+
+    def compile(self, filename, compiler=None):
+        compiler = compiler or self.compiler_for(filename)
+        path = os.path.abspath(filename)
+        mtime = os.path.getmtime(path)
+        with self.lock:
+            entry = self.compiled.get((compiler, path))
+        if entry is None or entry[0] != mtime:
+            entry = compile_entry((compiler, path))
+            with self.lock:
+                self.compiled[(compiler, path)] = entry
+        if entry[2] is not None:
+            raise entry[2]
+        return entry[1]
+
+    def warm_up(self, filenames, processes=None):
+        if isinstance(filenames, basestring):
+            directory = filenames
+            filenames = [os.path.join(directory, name) for name in sorted(os.listdir(directory))]
+        filenames = [filename for filename in filenames if os.path.splitext(filename)[1] in self.compilers]
+        forked = [filename for filename in filenames if self.compiler_for(filename) in self.gil_bound]
+        threaded = [filename for filename in filenames if filename not in forked]
+
+        if not forked:
+            return self.warm_up_threaded(threaded, processes)
+        jobs = [(self.compiler_for(filename), os.path.abspath(filename)) for filename in forked]
+        pool = multiprocessing.Pool(min(processes or multiprocessing.cpu_count(), len(forked)))
+        try:
+            entries = pool.map_async(compile_entry, jobs)
+            errors = self.warm_up_threaded(threaded, processes)
+            for filename, job, entry in zip(forked, jobs, entries.get()):
+                with self.lock:
+                    self.compiled[job] = entry
+                errors[filename] = entry[2]
+            return errors
+        finally:
+            pool.close()
+            pool.join()
+
+    def warm_up_threaded(self, filenames, processes=None):
+        if not filenames:
+            return {}
+        pool = ThreadPool(processes or len(filenames))
+        try:
+            return dict(zip(filenames, pool.map(self.try_compile, filenames)))
+        finally:
+            pool.close()
+            pool.join()
+
+    def try_compile(self, filename):
+        try:
+            self.compile(filename)
+            return None
+        except Exception as e:
+            return e
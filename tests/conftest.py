@@ -0,0 +1,33 @@
+import os
+import re
+
+import sim
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+EXAMPLE = re.compile(r"""['"](examples/[\w.-]+)['"]""")
+
+
+# Example contracts named in the source of the modules the collected tests come from
+def used_examples(items):
+    modules = set(str(item.fspath) for item in items)
+    filenames = set()
+    for module in modules:
+        with open(module) as f:
+            filenames.update(os.path.join(ROOT, name) for name in EXAMPLE.findall(f.read()))
+    return sorted(filename for filename in filenames if os.path.isfile(filename))
+
+
+def pytest_collection_finish(session):
+    # compile the examples the selected tests use up front and concurrently; errors are kept and raised in the
+    # test that loads the file. xdist workers (slaveinput before pytest-xdist 1.22, workerinput since) skip this
+    # and compile on first use instead, sharing the results through the compile cache on disk.
+    worker = hasattr(session.config, 'slaveinput') or hasattr(session.config, 'workerinput')
+    if os.environ.get('EVM_SIM_NO_WARM_UP') or worker:
+        return
+    sim.compiler_service.warm_up(used_examples(session.items))
+
+
+def pytest_terminal_summary(terminalreporter):
+    if sim.compile_cache is not None and (sim.compile_cache.hits or sim.compile_cache.misses):
+        terminalreporter.write_line("compile cache: %(hits)d hits, %(misses)d misses, %(evictions)d evictions" %
+                                    sim.compile_cache.stats())
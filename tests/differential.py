@@ -0,0 +1,128 @@
+import multiprocessing
+from timeit import default_timer
+
+from sim import Simulator, TransactionFailed
+from state_image import isolate_db
+
+
+# One implementation of the contract under comparison. normalize(slots), a module level function, maps the
+# decoded storage ({key: value}) to a form comparable between variants, e.g. when they use different layouts.
+class Variant(object):
+
+    def __init__(self, name, filename, compiler, normalize=None):
+        self.name = name
+        self.filename = filename
+        self.compiler = compiler
+        self.normalize = normalize
+
+
+class Mismatch(object):
+
+    def __init__(self, step, call, field, values):
+        self.step = step
+        self.call = call
+        self.field = field
+        self.values = values
+
+    def __repr__(self):
+        return '<Mismatch step=%r %s %r>' % (self.step, self.field, self.values)
+
+
+class Report(object):
+
+    def __init__(self, variants, runs, mismatches):
+        self.variants = variants
+        self.runs = runs
+        self.mismatches = mismatches
+
+    def rows(self):
+        for variant in self.variants:
+            run = self.runs[variant.name]
+            gas = sum(gas for (_, _, gas, _) in run['steps'])
+            elapsed = sum(elapsed for (_, _, _, elapsed) in run['steps'])
+            calls = len(run['steps'])
+            yield (variant.name, run['deploy_gas'], gas, float(gas) / calls if calls else 0.0, elapsed,
+                   calls / elapsed if elapsed else 0.0)
+
+    def __str__(self):
+        lines = ["%-20s %10s %12s %10s %10s %10s" % ('variant', 'deploy gas', 'gas', 'gas/call', 'time (s)', 'tx/s')]
+        for row in self.rows():
+            lines.append("%-20s %10d %12d %10.1f %10.4f %10.1f" % row)
+        for mismatch in self.mismatches:
+            lines.append("MISMATCH step %r %s: %r" % (mismatch.step, mismatch.field, mismatch.values))
+        return '\n'.join(lines)
+
+
+def storage(variant, view):
+    slots = dict(view.items())
+    return variant.normalize(slots) if variant.normalize is not None else slots
+
+
+# Deploys one variant and applies the calls, recording for every step the result (None when the transaction
+# failed), the storage slots it changed, its gas and its wall time
+def run_variant(args):
+    variant, founders, deployer, calls, kwargs = args
+    code = variant.compiler(variant.filename)
+    sim = Simulator(founders, **kwargs)
+    gas_used = sim.genesis.gas_used
+    contract = sim.load_contract(deployer, code, gas=100000)
+    deploy_gas = sim.genesis.gas_used - gas_used
+
+    view = sim.storage(contract)
+    initial = previous = storage(variant, view)
+    steps = []
+    for call in calls:
+        frm, data, value, gas = (tuple(call) + (0, Simulator.STARTGAS))[:4]
+        gas_used = sim.genesis.gas_used
+        start = default_timer()
+        result = next(sim.tx_stream([(frm, contract, value, data, gas)], errors='collect'))
+        elapsed = default_timer() - start
+
+        current = storage(variant, view)
+        changes = dict((key, current.get(key, 0)) for key in set(previous) | set(current)
+                       if previous.get(key, 0) != current.get(key, 0))
+        previous = current
+        steps.append((None if isinstance(result, TransactionFailed) else result, changes,
+                      sim.genesis.gas_used - gas_used, elapsed))
+    return {'deploy_gas': deploy_gas, 'storage': initial, 'steps': steps}
+
+
+# Feeds the same calls to every variant, each deployed by deployer in its own Simulator in a worker process,
+# and compares the storage right after deployment (reported as step None) and then the results and storage
+# changes of every step. As long as the initial storage matches, equal changes at every step mean equal
+# storage after it. Calls are (frm, data[, value[, gas]]).
+class Differential(object):
+
+    def __init__(self, variants, founders, deployer, **kwargs):
+        self.variants = variants
+        self.founders = founders
+        self.deployer = deployer
+        self.kwargs = kwargs
+
+    def run(self, calls, processes=None):
+        calls = list(calls)
+        pool = multiprocessing.Pool(processes or len(self.variants), initializer=isolate_db)
+        try:
+            runs = pool.map(run_variant, [(variant, self.founders, self.deployer, calls, self.kwargs)
+                                          for variant in self.variants])
+        finally:
+            pool.close()
+            pool.join()
+        runs = dict((variant.name, run) for (variant, run) in zip(self.variants, runs))
+        return Report(self.variants, runs, self.compare(calls, runs))
+
+    def compare(self, calls, runs):
+        mismatches = []
+        values = dict((name, run['storage']) for (name, run) in runs.iteritems())
+        if self.differ(values):
+            mismatches.append(Mismatch(None, None, 'storage', values))
+        for step, call in enumerate(calls):
+            for field, index in (('result', 0), ('storage', 1)):
+                values = dict((name, run['steps'][step][index]) for (name, run) in runs.iteritems())
+                if self.differ(values):
+                    mismatches.append(Mismatch(step, call, field, values))
+        return mismatches
+
+    def differ(self, values):
+        first = values[self.variants[0].name]
+        return any(value != first for value in values.itervalues())
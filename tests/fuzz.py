@@ -0,0 +1,138 @@
+import random
+from timeit import default_timer
+
+from pool import SimulatorPool
+from sim import Simulator
+
+_fuzzer = None
+
+
+def choice(options):
+    return lambda rng: rng.choice(options)
+
+
+def integers(lo, hi):
+    return lambda rng: rng.randint(lo, hi)
+
+
+# One production of the call grammar: a transaction from one of senders with data built from constants and
+# generators such as choice() and integers(). advance_time moves the block timestamp forward before the call.
+class Call(object):
+
+    def __init__(self, senders, data, weight=1, value=0, gas=Simulator.STARTGAS, advance_time=0):
+        self.senders = senders
+        self.data = data
+        self.weight = weight
+        self.value = value
+        self.gas = gas
+        self.advance_time = advance_time
+
+    def generate(self, rng):
+        return rng.choice(self.senders), [arg(rng) if callable(arg) else arg for arg in self.data]
+
+
+class Failure(object):
+
+    def __init__(self, seed, invariant, steps):
+        self.seed = seed
+        self.invariant = invariant
+        self.steps = steps
+
+    def __repr__(self):
+        return '<Failure seed=%r invariant=%s steps=%d>' % (self.seed, self.invariant, len(self.steps))
+
+
+class Report(object):
+
+    def __init__(self, failures, executed, elapsed):
+        self.failures = failures
+        self.executed = executed
+        self.elapsed = elapsed
+        self.tx_per_second = executed / elapsed if elapsed else 0.0
+
+
+def run_seed(sim, context, seed):
+    return _fuzzer.run_seed(sim, context, seed)
+
+
+# Generates random call sequences from a weighted grammar (a list of Call), runs them and checks every
+# invariant(sim, context) after each step. Contract-level failures of a call are not errors by themselves;
+# an invariant returning False or raising AssertionError is. Failing sequences are shrunk by removing steps
+# for as long as the same invariant keeps failing.
+class Fuzzer(object):
+
+    def __init__(self, grammar, invariants, length=100):
+        self.grammar = grammar
+        self.invariants = invariants
+        self.length = length
+        self.total_weight = sum(call.weight for call in grammar)
+
+    def generate(self, seed):
+        rng = random.Random(seed)
+        steps = []
+        for _ in range(self.length):
+            pick = rng.uniform(0, self.total_weight)
+            for index, call in enumerate(self.grammar):
+                pick -= call.weight
+                if pick <= 0:
+                    break
+            steps.append((index,) + call.generate(rng))
+        return steps
+
+    def check(self, sim, context):
+        for invariant in self.invariants:
+            try:
+                if invariant(sim, context) is False:
+                    return invariant.__name__
+            except AssertionError:
+                return invariant.__name__
+        return None
+
+    # Returns the number of executed steps and the name of the first failing invariant, if any
+    def execute(self, sim, context, steps):
+        for executed, (index, frm, data) in enumerate(steps, 1):
+            call = self.grammar[index]
+            sim.genesis.timestamp += call.advance_time
+            next(sim.tx_stream([(frm, context, call.value, data, call.gas)], errors='collect'))
+            invariant = self.check(sim, context)
+            if invariant is not None:
+                return executed, invariant
+        return len(steps), None
+
+    def shrink(self, sim, context, snapshot, steps, invariant):
+        chunk = len(steps) // 2
+        while chunk >= 1:
+            start = 0
+            while start < len(steps):
+                candidate = steps[:start] + steps[start + chunk:]
+                sim.revert(snapshot)
+                if candidate and self.execute(sim, context, candidate)[1] == invariant:
+                    steps = candidate
+                else:
+                    start += chunk
+            chunk //= 2
+        return steps
+
+    def run_seed(self, sim, context, seed):
+        steps = self.generate(seed)
+        snapshot = sim.snapshot()
+        executed, invariant = self.execute(sim, context, steps)
+        if invariant is None:
+            return executed, None
+        failure = Failure(seed, invariant, self.shrink(sim, context, snapshot, steps[:executed], invariant))
+        return executed, failure
+
+    # setup(sim) deploys the contract under test and returns its address, which is the context passed to the
+    # invariants and the target of every call
+    def run(self, founders, setup, seeds, processes=None, **kwargs):
+        global _fuzzer
+        _fuzzer = self
+        kwargs.setdefault('signed', False)
+        start = default_timer()
+        failures, executed = [], 0
+        with SimulatorPool(founders, setup=setup, processes=processes, **kwargs) as pool:
+            for count, failure in pool.imap_unordered(run_seed, seeds):
+                executed += count
+                if failure is not None:
+                    failures.append(failure)
+        return Report(sorted(failures, key=lambda failure: failure.seed), executed, default_timer() - start)
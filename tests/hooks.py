@@ -0,0 +1,36 @@
+from timeit import default_timer
+
+from pyethereum.opcodes import opcodes
+
+
+def opcode_at(code, pc):
+    if pc >= len(code):
+        return 'STOP'
+    op = code[pc]
+    if isinstance(op, str):
+        return opcodes.get(ord(op), ['INVALID'])[0]
+    return op[0]  # pre-processed code
+
+
+# Wraps processblock.apply_op so every executed op is reported to each hook's step(), with the pc and gas
+# from before the op, the compustate after it, the wall time it took and its message call depth. Hooks that
+# need to see the stack before the op runs can also implement before().
+def hooked_apply_op(apply_op, hooks):
+    depth = [0]
+    befores = [hook for hook in hooks if hasattr(hook, 'before')]
+
+    def _apply_op(block, tx, msg, code, compustate):
+        pc, gas = compustate.pc, compustate.gas
+        for hook in befores:
+            hook.before(block, msg, code, compustate, depth[0])
+        depth[0] += 1
+        start = default_timer()
+        try:
+            result = apply_op(block, tx, msg, code, compustate)
+        finally:
+            depth[0] -= 1
+        elapsed = default_timer() - start
+        for hook in hooks:
+            hook.step(block, msg, code, pc, gas, compustate, elapsed, depth[0])
+        return result
+    return _apply_op
@@ -0,0 +1,45 @@
+import multiprocessing
+
+from sim import Simulator
+from state_image import isolate_db
+
+_warm = None
+
+
+def run_scenario(args):
+    fn, scenario = args
+    sim, context, snapshot = _warm
+    sim.revert(snapshot)
+    return fn(sim, context, scenario)
+
+
+# Builds a Simulator once, lets setup(sim) deploy contracts and populate state, and forks workers from that
+# warm state. Workers keep reading the state they inherited, but their own writes stay in process memory.
+# map(fn, scenarios) calls fn(sim, context, scenario) in the workers, each scenario starting from the state
+# right after setup; context is whatever setup returned. fn must be a module level function.
+# Don't use self.sim in the parent while the pool is open.
+class SimulatorPool(object):
+
+    def __init__(self, founders, setup=None, processes=None, **kwargs):
+        global _warm
+        self.sim = Simulator(founders, **kwargs)
+        self.context = setup(self.sim) if setup is not None else None
+        self.snapshot = self.sim.snapshot()
+        _warm = (self.sim, self.context, self.snapshot)
+        self.pool = multiprocessing.Pool(processes, initializer=isolate_db)
+
+    def map(self, fn, scenarios, chunksize=1):
+        return self.pool.map(run_scenario, [(fn, scenario) for scenario in scenarios], chunksize)
+
+    def imap_unordered(self, fn, scenarios, chunksize=1):
+        return self.pool.imap_unordered(run_scenario, ((fn, scenario) for scenario in scenarios), chunksize)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
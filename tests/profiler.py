@@ -0,0 +1,62 @@
+import json
+
+from hooks import opcode_at
+
+
+# Simulator hook counting executions, gas and wall time per opcode and per (contract, pc). Time and gas of
+# CALL/CREATE include the nested message. Source lines are reported for contracts given a pc -> line map,
+# since the bundled compilers do not emit one.
+class Profiler(object):
+
+    def __init__(self):
+        self.ops = {}
+        self.pcs = {}
+        self.source_maps = {}
+
+    def map_source(self, contract, source_map):
+        self.source_maps[contract] = source_map
+
+    def step(self, block, msg, code, pc, gas, compustate, elapsed, depth):
+        op = opcode_at(code, pc)
+        used = gas - compustate.gas
+
+        stats = self.ops.setdefault(op, [0, 0, 0.0])
+        stats[0] += 1
+        stats[1] += used
+        stats[2] += elapsed
+
+        stats = self.pcs.setdefault((msg.to, pc), [op, 0, 0, 0.0])
+        stats[1] += 1
+        stats[2] += used
+        stats[3] += elapsed
+
+    def reset(self):
+        self.ops = {}
+        self.pcs = {}
+
+    def to_dict(self, sort='gas'):
+        ops = [{'opcode': op, 'count': count, 'gas': gas, 'time': time}
+               for (op, (count, gas, time)) in self.ops.iteritems()]
+        pcs = [{'contract': contract, 'pc': pc, 'line': self.source_maps.get(contract, {}).get(pc),
+                'opcode': op, 'count': count, 'gas': gas, 'time': time}
+               for ((contract, pc), (op, count, gas, time)) in self.pcs.iteritems()]
+        ops.sort(key=lambda row: (-row[sort], row['opcode']))
+        pcs.sort(key=lambda row: (-row[sort], row['contract'], row['pc']))
+        return {'opcodes': ops, 'pcs': pcs}
+
+    def to_json(self, sort='gas'):
+        return json.dumps(self.to_dict(sort), indent=2)
+
+    def report(self, sort='gas', limit=20):
+        profile = self.to_dict(sort)
+        lines = ["%-12s %10s %10s %12s" % ('opcode', 'count', 'gas', 'time (ms)')]
+        for row in profile['opcodes'][:limit]:
+            lines.append("%-12s %10d %10d %12.3f" % (row['opcode'], row['count'], row['gas'], row['time'] * 1000))
+        lines.append('')
+        lines.append("%-40s %6s %6s %-12s %10s %10s %12s" % ('contract', 'pc', 'line', 'opcode', 'count', 'gas',
+                                                             'time (ms)'))
+        for row in profile['pcs'][:limit]:
+            lines.append("%-40s %6d %6s %-12s %10d %10d %12.3f" % (row['contract'], row['pc'], row['line'] or '',
+                                                                   row['opcode'], row['count'], row['gas'],
+                                                                   row['time'] * 1000))
+        return '\n'.join(lines)
@@ -0,0 +1,237 @@
+import gzip
+import hashlib
+import json
+
+from pyethereum import rlp
+
+from sim import Simulator, TransactionFailed
+
+
+def open_log(path, mode):
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+# Hash of every account's nonce and storage root, plus the balance of contracts. Code is left out, so a
+# replay deploying modified code can still match, and so are the balances of externally owned accounts,
+# which pay for gas and so change with any change to the code they call.
+def state_digest(sim):
+    sim.freeze()
+    h = hashlib.sha256()
+    for address, data in sorted(sim.genesis.state.to_dict().iteritems()):
+        nonce, balance, storage_root = rlp.decode(data)[:3]
+        h.update(rlp.encode([address, nonce, storage_root, balance if sim.genesis.get_code(address.encode('hex')) else '']))
+    return h.hexdigest()
+
+
+# Appends every load_contract and transaction of sim to a log, one JSON array per line (gzipped when path
+# ends in .gz):
+#
+#   ["start", founders, state root, block number, timestamp, image]
+#   ["create", sender, code, endowment, gas, contract]
+#   ["tx", sender, to, value, calldata, gas, result]       result is null when the transaction failed
+#   ["block", number, timestamp]                           written when either changed since the last call
+#   ["checkpoint", calls so far, state digest]
+#
+# Binary values are hex encoded. Every checkpoint_interval calls the state is committed and its state_digest
+# written as a checkpoint. A recording that starts from anything but the founders' genesis state also saves a state
+# image next to the log to start replays from.
+class Recorder(object):
+
+    def __init__(self, sim, path, checkpoint_interval=100):
+        self.sim = sim
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.count = 0
+        self.block = (sim.genesis.number, sim.genesis.timestamp)
+
+        root = sim.freeze()
+        image = None
+        if root != Simulator(sim.founders).freeze():
+            image = path + '.image'
+            sim.save_image(image)
+        self.f = open_log(path, 'wb')
+        self.write(['start', sim.founders, root.encode('hex'), self.block[0], self.block[1], image])
+        sim.recorder = self
+
+    def write(self, entry):
+        self.f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def call(self, entry):
+        block = (self.sim.genesis.number, self.sim.genesis.timestamp)
+        if block != self.block:
+            self.write(['block', block[0], block[1]])
+            self.block = block
+        self.write(entry)
+        self.count += 1
+        if self.count % self.checkpoint_interval == 0:
+            self.checkpoint()
+
+    def create(self, frm, code, endowment, gas, contract):
+        self.call(['create', frm.address, code.encode('hex'), endowment, gas, contract])
+
+    def tx(self, frm, to, value, data, gas, result):
+        self.call(['tx', frm.address, to, value, data.encode('hex'), gas, result])
+
+    def checkpoint(self):
+        self.write(['checkpoint', self.count, state_digest(self.sim)])
+
+    def close(self):
+        if self.sim.recorder is self:
+            self.sim.recorder = None
+            self.checkpoint()
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def strs(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [strs(item) for item in value]
+    if isinstance(value, dict):
+        return dict((strs(k), strs(v)) for (k, v) in value.iteritems())
+    return value
+
+
+def read_log(path):
+    with open_log(path, 'rb') as f:
+        return [strs(json.loads(line)) for line in f]
+
+
+# Stands in for a Key when replaying: unsigned Simulators only need the sender's address
+class Sender(object):
+
+    def __init__(self, address):
+        self.address = address
+        self.key = None
+
+
+class Divergence(object):
+
+    # index is the number of calls before the diverging one; for a state divergence that could not be narrowed
+    # down to a single call, index and last are the bounds of the checkpoint window
+    def __init__(self, index, kind, expected, actual, last=None):
+        self.index = index
+        self.kind = kind
+        self.expected = expected
+        self.actual = actual
+        self.last = last
+
+    def __repr__(self):
+        return '<Divergence %s at %r>' % (self.kind, self.index if self.last is None else (self.index, self.last))
+
+
+# Re-executes a recorded log in an unsigned Simulator with lazy state roots, compares every call's result and
+# every checkpoint's state digest, and returns the first Divergence (None when the replay matches). substitute
+# maps recorded contract code to the code to deploy instead, e.g. a modified contract. When a checkpoint's
+# digest differs without any result differing, the original code is replayed alongside and the window since
+# the previous checkpoint is bisected, comparing digests, down to the first diverging call. Only the snapshot
+# at the start of the current window is kept. State images loaded for the replay are closed when run returns.
+class Replayer(object):
+
+    def __init__(self, path, substitute=None, **kwargs):
+        self.log = read_log(path)
+        self.substitute = substitute or {}
+        kwargs.setdefault('signed', False)
+        kwargs.setdefault('lazy_state', True)
+        self.kwargs = kwargs
+
+        start = self.log[0]
+        assert start[0] == 'start', "%s is not a replay log" % path
+        self.founders, self.start_root, self.image = start[1], start[2].decode('hex'), start[5]
+        self.calls = [entry for entry in self.log if entry[0] in ('create', 'tx')]
+        self.senders = dict((entry[1], Sender(entry[1])) for entry in self.calls)
+        self.images = []
+
+    def simulator(self):
+        sim = Simulator(self.founders, **self.kwargs)
+        if self.image is not None:
+            self.images.append(sim.load_image(self.image, self.senders.values()))
+        assert sim.freeze() == self.start_root, "replay does not start from the recorded state"
+        sim.genesis.number, sim.genesis.timestamp = self.log[0][3], self.log[0][4]
+        return sim
+
+    def apply(self, sim, entry, substitute):
+        if entry[0] == 'block':
+            if entry[1] > sim.genesis.number:
+                sim.mine(entry[1] - sim.genesis.number, 0)
+            sim.genesis.timestamp = entry[2]
+            return None
+        frm = self.senders[entry[1]]
+        if entry[0] == 'create':
+            code = entry[2].decode('hex')
+            try:
+                return sim.load_contract(frm, substitute.get(code, code), entry[3], entry[4])
+            except AssertionError:
+                return None
+        data = bytearray(entry[4].decode('hex'))
+        result = next(sim.tx_stream([(frm, entry[2], entry[3], data, entry[5])], errors='collect'))
+        return None if isinstance(result, TransactionFailed) else result
+
+    def run(self):
+        try:
+            return self.replay()
+        finally:
+            while self.images:
+                self.images.pop().close()
+
+    def replay(self):
+        sim = self.simulator()
+        count, window = 0, (1, sim.snapshot())
+        for position, entry in enumerate(self.log[1:], 1):
+            if entry[0] == 'checkpoint':
+                digest = state_digest(sim)
+                if digest != entry[2]:
+                    return self.bisect(sim, window, position, entry[2], digest)
+                sim.discard(window[1])
+                window = (position, sim.snapshot())
+            elif entry[0] == 'block':
+                self.apply(sim, entry, self.substitute)
+            else:
+                result = self.apply(sim, entry, self.substitute)
+                expected = entry[-1]
+                if result != expected:
+                    return Divergence(count, 'result', expected, result)
+                count += 1
+        return None
+
+    def calls_before(self, position):
+        return sum(1 for entry in self.log[1:position] if entry[0] in ('create', 'tx'))
+
+    # Replays log[start:stop] in both Simulators from their snapshots and compares the resulting states
+    def same_state(self, sim, reference, start, stop, snapshots):
+        for s, snapshot, substitute in zip((sim, reference), snapshots, (self.substitute, {})):
+            s.revert(snapshot)
+            for entry in self.log[start:stop]:
+                if entry[0] != 'checkpoint':
+                    self.apply(s, entry, substitute)
+        return state_digest(sim) == state_digest(reference)
+
+    def bisect(self, sim, window, checkpoint, expected, actual):
+        start, snapshot = window
+        first, last = self.calls_before(start), self.calls_before(checkpoint)
+        if not self.substitute:
+            # nothing to compare against within the window: report it as a whole
+            return Divergence(first, 'state', expected, actual, last)
+
+        reference = self.simulator()
+        for entry in self.log[1:start]:
+            if entry[0] != 'checkpoint':
+                self.apply(reference, entry, {})
+        snapshots = (snapshot, reference.snapshot())
+
+        # the state matches after log[:lo] and differs after log[:hi]
+        lo, hi = start, checkpoint
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.same_state(sim, reference, start, mid, snapshots):
+                lo = mid
+            else:
+                hi = mid
+        self.same_state(sim, reference, start, hi, snapshots)
+        return Divergence(self.calls_before(hi - 1), 'state', state_digest(reference), state_digest(sim))
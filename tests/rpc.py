@@ -0,0 +1,406 @@
+# Local JSON-RPC front-end for a Simulator.
+#
+#   python tests/rpc.py serve [--port 8545 | --unix /tmp/evm-sim.sock] [--accounts cow,cat]
+#   python tests/rpc.py load [--port 8545 | --unix path] [--method call|send] [--requests 10000]
+#                            [--connections 4] [--depth 16]
+#
+# The protocol is JSON-RPC 2.0 with one request (or batch, a JSON array) per line, over TCP on localhost or a
+# Unix socket. Requests can be pipelined: a connection keeps reading while earlier requests run, and
+# responses are written as they complete, so clients match them by id. Every request gets a response.
+#
+# Methods; accounts are given by the secret their Key is derived from (e.g. "cow"), data as a list of ints
+# and strings, code as hex:
+#
+#   sim_deploy(from, code[, endowment[, gas]])         -> contract address
+#   sim_send(from, to, value, data[, gas])              -> decoded result
+#   sim_call(from, to, data[, value[, gas]])            -> decoded result, no state changes
+#   sim_storage(contract, key)                          -> int
+#   sim_balance(address)                                -> int
+#   sim_advanceTime(seconds)                            -> new timestamp
+#   sim_mine([n[, timestamp_step]])                     -> new block number
+#
+# Writes run one at a time, in order, on a single thread. After each write that thread freezes the state and
+# builds a read-only block on it (see Simulator.overlay), which it then publishes. Reads (call, storage,
+# balance) run concurrently on a thread pool, each on its own copy of the last published block, so they never
+# touch the block a write is executing on; a read pipelined behind a write may run before it. Don't add hooks
+# to a served Simulator: they patch processblock while executing, which concurrent reads would see.
+
+import argparse
+import json
+from multiprocessing.pool import ThreadPool
+import Queue
+import socket
+import SocketServer
+import sys
+import threading
+from timeit import default_timer
+
+from sim import Key, Simulator, TransactionFailed, compile_serpent
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class RPCError(Exception):
+
+    def __init__(self, code, message):
+        super(RPCError, self).__init__(code, message)
+        self.code = code
+        self.message = message
+
+
+def strs(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [strs(item) for item in value]
+    return value
+
+
+class Handler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        lock = threading.Lock()
+        pending = threading.Condition()
+        self.outstanding = 0
+
+        def reply(response):
+            with lock:
+                try:
+                    self.wfile.write(json.dumps(response, separators=(',', ':')) + '\n')
+                    self.wfile.flush()
+                except (IOError, socket.error):
+                    pass  # the client went away
+            with pending:
+                self.outstanding -= 1
+                pending.notify()
+
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            with pending:
+                self.outstanding += 1
+            self.server.rpc.dispatch(line, reply)
+
+        # let requests still running reply before the connection is closed
+        with pending:
+            while self.outstanding:
+                pending.wait()
+
+
+class ThreadingTCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ThreadingUnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+# Collects the responses of a batch and replies with all of them, in request order, once the last is in
+class Batch(object):
+
+    def __init__(self, size, reply):
+        self.responses = [None] * size
+        self.remaining = size
+        self.reply = reply
+        self.lock = threading.Lock()
+
+    def slot(self, index):
+        def reply(response):
+            with self.lock:
+                self.responses[index] = response
+                self.remaining -= 1
+                done = self.remaining == 0
+            if done:
+                self.reply(self.responses)
+        return reply
+
+
+# Serves sim on address: a (host, port) tuple for TCP, or a path for a Unix socket. Port 0 picks a free
+# port; see self.address for the one in use.
+class Server(object):
+
+    WRITES = ('sim_deploy', 'sim_send', 'sim_advanceTime', 'sim_mine')
+    READS = ('sim_call', 'sim_storage', 'sim_balance')
+
+    def __init__(self, sim, address=('127.0.0.1', 0), readers=4):
+        self.sim = sim
+        self.keys = {}
+        self.keys_lock = threading.Lock()
+        self.base = sim.overlay()
+        self.writes = Queue.Queue()
+        self.readers = ThreadPool(readers)
+        if isinstance(address, tuple):
+            self.server = ThreadingTCPServer(address, Handler)
+        else:
+            self.server = ThreadingUnixServer(address, Handler)
+        self.server.rpc = self
+        self.address = self.server.server_address
+        self.threads = [threading.Thread(target=self.write_loop), threading.Thread(target=self.server.serve_forever)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.writes.put(None)
+        self.readers.close()
+        self.readers.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_loop(self):
+        while True:
+            run = self.writes.get()
+            if run is None:
+                return
+            run()
+
+    def dispatch(self, line, reply):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            reply(self.error(None, RPCError(PARSE_ERROR, 'parse error')))
+            return
+        if isinstance(request, list):
+            if not request:
+                reply(self.error(None, RPCError(INVALID_REQUEST, 'empty batch')))
+                return
+            batch = Batch(len(request), reply)
+            for index, item in enumerate(request):
+                self.submit(item, batch.slot(index))
+        else:
+            self.submit(request, reply)
+
+    def submit(self, request, reply):
+        if not isinstance(request, dict) or not isinstance(request.get('method'), basestring):
+            reply(self.error(None, RPCError(INVALID_REQUEST, 'invalid request')))
+            return
+        id_, method, params = request.get('id'), str(request['method']), strs(request.get('params', []))
+        if method not in self.WRITES + self.READS:
+            reply(self.error(id_, RPCError(METHOD_NOT_FOUND, 'method not found: %s' % method)))
+            return
+        if not isinstance(params, list):
+            reply(self.error(id_, RPCError(INVALID_PARAMS, 'params must be a list')))
+            return
+
+        def run():
+            try:
+                response = {'jsonrpc': '2.0', 'id': id_, 'result': getattr(self, method)(*params)}
+            except TypeError as e:
+                response = self.error(id_, RPCError(INVALID_PARAMS, str(e)))
+            except RPCError as e:
+                response = self.error(id_, e)
+            except Exception as e:
+                response = self.error(id_, RPCError(SERVER_ERROR, repr(e)))
+            if method in self.WRITES:
+                self.base = self.sim.overlay()  # before replying, so the client's next read sees the write
+            reply(response)
+
+        if method in self.WRITES:
+            self.writes.put(run)
+        else:
+            self.readers.apply_async(run)
+
+    def error(self, id_, e):
+        return {'jsonrpc': '2.0', 'id': id_, 'error': {'code': e.code, 'message': e.message}}
+
+    # one Key object per secret, as the Simulator tracks nonces per Key object
+    def key(self, secret):
+        with self.keys_lock:
+            if secret not in self.keys:
+                self.keys[secret] = Key(secret)
+            return self.keys[secret]
+
+    def sim_deploy(self, frm, code, endowment=0, gas=Simulator.STARTGAS):
+        code = code[2:] if code.startswith('0x') else code
+        try:
+            return self.sim.load_contract(self.key(frm), code.decode('hex'), endowment, gas)
+        except AssertionError:
+            raise RPCError(SERVER_ERROR, 'contract creation failed')
+
+    def sim_send(self, frm, to, value, data, gas=Simulator.STARTGAS):
+        result = next(self.sim.tx_stream([(self.key(frm), to, value, data, gas)], errors='collect'))
+        if isinstance(result, TransactionFailed):
+            raise RPCError(SERVER_ERROR, 'transaction failed: %r' % (result.cause,))
+        return result
+
+    def sim_advanceTime(self, seconds):
+        self.sim.genesis.timestamp += seconds
+        return self.sim.genesis.timestamp
+
+    def sim_mine(self, n=1, timestamp_step=Simulator.BLOCK_TIME):
+        self.sim.mine(n, timestamp_step)
+        return self.sim.genesis.number
+
+    def sim_call(self, frm, to, data, value=0, gas=Simulator.STARTGAS):
+        try:
+            return self.sim.call(self.key(frm), to, data, value, gas, base=self.base)
+        except TransactionFailed:
+            raise RPCError(SERVER_ERROR, 'call failed')
+
+    def sim_storage(self, contract, key):
+        return self.sim.overlay(base=self.base).get_storage_data(contract, key)
+
+    def sim_balance(self, address):
+        return self.sim.overlay(base=self.base).get_balance(address)
+
+
+class Client(object):
+
+    def __init__(self, address):
+        family = socket.AF_INET if isinstance(address, tuple) else socket.AF_UNIX
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.connect(address)
+        self.rfile = self.socket.makefile('rb')
+        self.wfile = self.socket.makefile('wb')
+        self.next_id = 0
+
+    def close(self):
+        self.rfile.close()
+        self.wfile.close()
+        self.socket.close()
+
+    # Writes a request without waiting for its response; returns its id
+    def send(self, method, *params):
+        self.next_id += 1
+        self.wfile.write(json.dumps({'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params}) + '\n')
+        return self.next_id
+
+    def flush(self):
+        self.wfile.flush()
+
+    def receive(self):
+        line = self.rfile.readline()
+        if not line:
+            raise EOFError('connection closed')
+        return json.loads(line)
+
+    def result(self, response):
+        if 'error' in response:
+            raise RPCError(response['error']['code'], response['error']['message'])
+        return strs(response['result'])
+
+    def request(self, method, *params):
+        id_ = self.send(method, *params)
+        self.flush()
+        while True:
+            response = self.receive()
+            if response.get('id') == id_:
+                return self.result(response)
+
+    # Sends all (method, params) calls as one batch and returns their results in order
+    def batch(self, calls):
+        requests = []
+        for method, params in calls:
+            self.next_id += 1
+            requests.append({'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': list(params)})
+        self.wfile.write(json.dumps(requests) + '\n')
+        self.flush()
+        return [self.result(response) for response in self.receive()]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+# Sends requests copies of (method, params) over connections connections, keeping up to depth requests in
+# flight on each, and reports latency percentiles (in seconds, None when no request completed) and requests
+# per second
+def load_test(address, method, params, requests=10000, connections=4, depth=16):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(count):
+        client = Client(address)
+        sent, local = {}, []
+        try:
+            for _ in range(min(depth, count)):
+                sent[client.send(method, *params)] = default_timer()
+            client.flush()
+            remaining = count - len(sent)
+            while sent:
+                response = client.receive()
+                local.append(default_timer() - sent.pop(response['id']))
+                if remaining:
+                    sent[client.send(method, *params)] = default_timer()
+                    client.flush()
+                    remaining -= 1
+        finally:
+            client.close()
+        with lock:
+            latencies.extend(local)
+
+    counts = [requests // connections + (1 if i < requests % connections else 0) for i in range(connections)]
+    threads = [threading.Thread(target=worker, args=(count,)) for count in counts if count]
+    start = default_timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = default_timer() - start
+
+    latencies.sort()
+    return {'requests': len(latencies), 'elapsed': elapsed,
+            'requests_per_second': len(latencies) / elapsed if elapsed else 0.0,
+            'p50': percentile(latencies, 0.5), 'p90': percentile(latencies, 0.9),
+            'p99': percentile(latencies, 0.99), 'max': percentile(latencies, 1.0)}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Serve a Simulator over JSON-RPC, or load test a server')
+    parser.add_argument('command', choices=['serve', 'load'])
+    parser.add_argument('--port', type=int, default=8545)
+    parser.add_argument('--unix', help='Unix socket path instead of a TCP port')
+    parser.add_argument('--accounts', default='cow,cat', help='secrets of the founder accounts')
+    parser.add_argument('--method', choices=['call', 'send'], default='call')
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=16, help='requests in flight per connection')
+    args = parser.parse_args(argv)
+    address = args.unix or ('127.0.0.1', args.port)
+    accounts = args.accounts.split(',')
+
+    if args.command == 'serve':
+        sim = Simulator(dict((Key(secret).address, 10**24) for secret in accounts), signed=False)
+        server = Server(sim, address)
+        print("serving on %s" % (server.address,))
+        try:
+            while True:
+                threading.Event().wait(3600)
+        except KeyboardInterrupt:
+            server.close()
+        return 0
+
+    client = Client(address)
+    code = compile_serpent('examples/subcurrency.se').encode('hex')
+    contract = client.request('sim_deploy', accounts[0], code)
+    client.close()
+    to = Key(accounts[1]).address
+    if args.method == 'call':
+        stats = load_test(address, 'sim_call', [accounts[0], contract, [to]], args.requests, args.connections,
+                          args.depth)
+    else:
+        stats = load_test(address, 'sim_send', [accounts[0], contract, 0, [to, 1]], args.requests, args.connections,
+                          args.depth)
+    print("%(requests)d requests in %(elapsed).2f s: %(requests_per_second).1f req/s" % stats)
+    if not stats['requests']:
+        return 1
+    print("latency p50 %.2f ms  p90 %.2f ms  p99 %.2f ms  max %.2f ms" % tuple(
+        stats[p] * 1000 for p in ('p50', 'p90', 'p99', 'max')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
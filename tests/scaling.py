@@ -0,0 +1,164 @@
+# Scaling analysis of calls whose cost grows with a contract-managed list.
+#
+#   python tests/scaling.py [--points 1,10,50,100,200,500] [--gas-limit 1000000] [--csv results.csv] [name ...]
+#
+# For every point n, a scenario fills the contract with n items (bulk loaded, see Simulator.load_state) and
+# the measured call then runs in a block of its own. Gas, wall time and peak RSS are measured in a forked
+# process per point. Gas and time are fitted to O(1), O(log n), O(n), O(n log n) and O(n^2), and the best
+# gas fit predicts the smallest n at which the call no longer fits in the gas limit.
+
+import argparse
+import csv
+import math
+import resource
+import sys
+from timeit import default_timer
+
+from bench import ALICE, FOUNDERS, run_isolated
+from sim import Simulator, TransactionFailed, compile_serpent
+
+ACCOUNT_LIST_OFFSET = 2**160
+ACCOUNT_MAP_OFFSET = 2**161
+
+MODELS = [
+    ('O(1)', lambda n: 0.0),
+    ('O(log n)', lambda n: math.log(n)),
+    ('O(n)', lambda n: float(n)),
+    ('O(n log n)', lambda n: n * math.log(n)),
+    ('O(n^2)', lambda n: float(n) * n),
+]
+
+SCENARIOS = []
+
+
+def scenario(name, contract, compiler=compile_serpent):
+    def register(fn):
+        SCENARIOS.append((name, contract, compiler, fn))
+        return fn
+    return register
+
+
+@scenario('mutuala_tick', 'examples/mutuala.se')
+def mutuala_tick(sim, contract, n):
+    # n accounts besides ALICE's, all due 30 days of capital tax. Account records take 3 slots each, so the
+    # addresses are spaced 3 apart.
+    storage = {ACCOUNT_LIST_OFFSET - 1: n + 1}
+    for idx in range(1, n + 1):
+        account = 3 * idx
+        storage[ACCOUNT_LIST_OFFSET + idx] = account
+        storage[ACCOUNT_MAP_OFFSET + account] = 10**9
+        storage[ACCOUNT_MAP_OFFSET + account + 1] = sim.genesis.timestamp
+    sim.load_state({contract: {'storage': storage}})
+    sim.genesis.timestamp += 30 * 86400
+    return ALICE, ['tick']
+
+
+def measure(filename, compiler, fn, n, gas_limit):
+    code = compiler(filename)
+    sim = Simulator(FOUNDERS, signed=False)
+    contract = sim.load_contract(ALICE, code, gas=100000)
+    frm, data = fn(sim, contract, n)
+    sim.mine()
+
+    start = default_timer()
+    result = next(sim.tx_stream([(frm, contract, 0, data, gas_limit)], errors='collect'))
+    elapsed = default_timer() - start
+    return {'n': n, 'gas': sim.genesis.gas_used, 'time': elapsed, 'ok': not isinstance(result, TransactionFailed),
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+# Least squares fit of y = a + b * f(n) for every model; returns (model, a, b) with the smallest squared error
+def fit(ns, ys):
+    best = None
+    for name, f in MODELS:
+        xs = [f(n) for n in ns]
+        mean_x, mean_y = sum(xs) / len(xs), float(sum(ys)) / len(ys)
+        sxx = sum((x - mean_x) ** 2 for x in xs)
+        b = sum((x - mean_x) * (y - mean_y) for (x, y) in zip(xs, ys)) / sxx if sxx else 0.0
+        a = mean_y - b * mean_x
+        error = sum((a + b * x - y) ** 2 for (x, y) in zip(xs, ys))
+        if best is None or error < best[0] * (1 - 1e-9):
+            best = (error, name, a, b)
+    return best[1:]
+
+
+def predict(model, a, b, n):
+    return a + b * dict(MODELS)[model](n)
+
+
+# The smallest n for which the fitted value exceeds limit, or None if it never does (up to 10^12)
+def breaking_point(model, a, b, limit):
+    if predict(model, a, b, 1) > limit:
+        return 1
+    hi = 2
+    while predict(model, a, b, hi) <= limit:
+        if hi > 10**12:
+            return None
+        hi *= 2
+    lo = hi // 2
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if predict(model, a, b, mid) > limit:
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+
+def analyze(results, gas_limit):
+    ok = [result for result in results if result['ok']]
+    if len(ok) < 2:
+        return None
+    ns = [result['n'] for result in ok]
+    gas_fit = fit(ns, [result['gas'] for result in ok])
+    time_fit = fit(ns, [result['time'] for result in ok])
+    return gas_fit, time_fit, breaking_point(gas_fit[0], gas_fit[1], gas_fit[2], gas_limit)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measure how calls scale with contract-managed lists')
+    parser.add_argument('names', nargs='*', help='scenarios to run (default: all)')
+    parser.add_argument('--points', default='1,10,50,100,200,500', help='comma separated values of n')
+    parser.add_argument('--gas-limit', type=int, default=10**6, help='gas of the measured call')
+    parser.add_argument('--csv', help='write the measurements as CSV')
+    args = parser.parse_args(argv)
+    points = [int(point) for point in args.points.split(',')]
+
+    rows = []
+    for (name, filename, compiler, fn) in SCENARIOS:
+        if args.names and name not in args.names:
+            continue
+        results = []
+        print("%-16s %8s %10s %10s %10s" % (name, 'n', 'gas', 'time (ms)', 'rss (KB)'))
+        for n in points:
+            result = run_isolated(measure, (filename, compiler, fn, n, args.gas_limit))
+            if 'error' in result:
+                print("%-16s %8d skipped: %s" % ('', n, result['error']))
+                continue
+            results.append(result)
+            rows.append((name, n, result['gas'], result['time'], result['peak_rss_kb'], result['ok']))
+            print("%-16s %8d %10d %10.2f %10d%s" % ('', n, result['gas'], result['time'] * 1000,
+                                                    result['peak_rss_kb'], '' if result['ok'] else '  FAILED'))
+
+        analysis = analyze(results, args.gas_limit)
+        if analysis is None:
+            print("not enough successful points to fit")
+            continue
+        (gas_model, a, b), (time_model, c, d), limit = analysis
+        print("gas  %s: %.1f + %.4g * f(n)" % (gas_model, a, b))
+        print("time %s: %.4g + %.4g * f(n) s" % (time_model, c, d))
+        if limit is None:
+            print("fits in %d gas for any n" % args.gas_limit)
+        else:
+            print("exceeds %d gas at n = %d" % (args.gas_limit, limit))
+
+    if args.csv:
+        with open(args.csv, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(['scenario', 'n', 'gas', 'time', 'peak_rss_kb', 'ok'])
+            writer.writerows(rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
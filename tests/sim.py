@@ -1,11 +1,39 @@
-from collections import Counter
+from collections import Counter, deque, namedtuple
+import contextlib
+import copy
+import itertools
+import multiprocessing
+import os
 import subprocess
+import sys
+import weakref
 
-from pyethereum import transactions, blocks, processblock, utils
+from pyethereum import transactions, blocks, processblock, rlp, trie, utils
 from serpent import encode_datalist, decode_datalist
+import serpent
+
+from compile_cache import CompileCache, DEFAULT_PATH, DEFAULT_MAX_SIZE, fingerprint
+from call_template import CallTemplate
+from compiler_service import CompilerService
+from hooks import hooked_apply_op
+from storage_view import CompactStorageView, StorageView
+import state_image
+import state_loader
+import tracer
+
+compile_cache = None
+if not os.environ.get('EVM_SIM_NO_CACHE'):
+    compile_cache = CompileCache(os.environ.get('EVM_SIM_CACHE_DIR', DEFAULT_PATH),
+                                 int(os.environ.get('EVM_SIM_CACHE_SIZE', DEFAULT_MAX_SIZE)))
 
 
 def compile_cli(cmd, args, filename):
+    if compile_cache is None:
+        return run_compiler(cmd, args, filename)
+    return compile_cache.compile(cmd, args, filename, run_compiler)
+
+
+def run_compiler(cmd, args, filename):
     try:
         output = subprocess.check_output([cmd] + args + [filename], stderr=subprocess.STDOUT)
     except subprocess.CalledProcessError as e:
@@ -14,24 +42,90 @@ def compile_cli(cmd, args, filename):
     return output.strip().decode('hex')
 
 
-def compile_serpent(filename):
-    # with open(filename) as f:
-    #     return compile(f.read())
+def compile_serpent_in_process(cmd, args, filename):
+    with open(filename) as f:
+        try:
+            return serpent.compile(f.read())
+        except Exception as e:
+            raise CompilationException(str(e))
+
+
+# Identifies the serpent module for the compile cache, rather than whatever serpent binary is on the PATH
+def serpent_version():
+    return getattr(serpent, '__version__', None) or fingerprint(os.path.realpath(serpent.__file__))
+
+
+def build_serpent(filename):
+    if hasattr(serpent, 'compile') and not os.environ.get('EVM_SIM_SERPENT_CLI'):
+        if compile_cache is None:
+            return compile_serpent_in_process("serpent", [], filename)
+        return compile_cache.compile("serpent", ["in-process"], filename, compile_serpent_in_process,
+                                     serpent_version())
     return compile_cli("serpent", ["compile"], filename)
 
 
-def compile_lll(filename):
+def build_lll(filename):
     return compile_cli("lllc", [], filename)
 
 
-def compile_mutan(filename):
+def build_mutan(filename):
     return compile_cli("mutan", [], filename)
 
 
+compiler_service = CompilerService({'.se': build_serpent, '.lll': build_lll, '.mu': build_mutan}, gil_bound=[build_serpent])
+
+
+def compile_serpent(filename):
+    return compiler_service.compile(filename, build_serpent)
+
+
+def compile_lll(filename):
+    return compiler_service.compile(filename, build_lll)
+
+
+def compile_mutan(filename):
+    return compiler_service.compile(filename, build_mutan)
+
+
 class CompilationException(Exception):
     pass
 
 
+class TransactionFailed(Exception):
+
+    def __init__(self, index, call, cause=None):
+        super(TransactionFailed, self).__init__(index, call, cause)
+        self.index = index
+        self.call = call
+        self.cause = cause
+
+
+def sign_transaction(args):
+    _tx, key = args
+    return _tx.sign(key)
+
+
+# Every Simulator in this process, for prune
+simulators = weakref.WeakSet()
+
+Header = namedtuple('Header', ['number', 'hash', 'prevhash', 'timestamp', 'state_root', 'tx_list_root', 'gas_used'])
+
+
+# Next nonce per Key. A Key that has not sent anything through the Simulator yet starts from its account's
+# nonce in the current state, e.g. one set by load_state.
+class Nonces(Counter):
+
+    def __init__(self, sim, *args):
+        super(Nonces, self).__init__(*args)
+        self.sim = sim
+
+    def __missing__(self, key):
+        return self.sim.genesis.get_nonce(key.address)
+
+    def copy(self):
+        return Nonces(self.sim, self)
+
+
 class Key(object):
 
     def __init__(self, secret):
@@ -43,37 +137,424 @@ class Simulator(object):
 
     GASPRICE = 10**12
     STARTGAS = 10000
+    BLOCK_TIME = 15
 
-    def __init__(self, founders):
+    SNAPSHOT_ATTRS = ('gas_used', 'timestamp', 'transaction_count', 'number', 'prevhash')
+
+    # With signed=False transactions are not ECDSA signed; the sender's address is set on the transaction
+    # directly, which is what pyethereum would otherwise recover from the signature. Gas, nonce and value
+    # handling are unchanged.
+    # With lazy_state=True changes stay in the block's in-memory caches instead of being written to the tries
+    # after every transaction; the tries and state root are only updated when needed, e.g. by freeze(). The
+    # intermediate state root pyethereum stores with each transaction in the transaction list is then the last
+    # committed one, so the transactions root, and with it mined header hashes and PREVHASH, differ from eager mode.
+    # retention is the number of mined block headers kept (see mine); with prune_state=True trie nodes only
+    # reachable from older blocks are dropped from memory as well.
+    # With compact_storage=True storage views pack their slots into bytearrays (see CompactStorageView). Only
+    # the views shrink; the state's storage tries take the same memory either way.
+    def __init__(self, founders, signed=True, lazy_state=False, retention=256,
+                 prune_state=False, compact_storage=False):
         self.founders = founders
+        self.signed = signed
+        self.lazy_state = lazy_state
+        self.retention = retention
+        self.prune_state = prune_state
+        self.compact_storage = compact_storage
+        self.hooks = []
+        self.recorder = None  # see replay.Recorder
         self.reset()
+        simulators.add(self)
+
+    # Changes to the state other than creations and transactions are not recorded, so a replay would apply the
+    # calls before and after them on top of each other: refuse them while a replay.Recorder is attached
+    def check_unrecorded(self, operation):
+        if self.recorder is not None:
+            raise RuntimeError("%s cannot be recorded; close the Recorder first" % operation)
 
     def reset(self):
+        self.check_unrecorded('reset')
         self.genesis = blocks.genesis(self.founders)
         self.genesis.timestamp = 1388534400  # 2014-01-01
-        self.nonce = Counter()
+        self.nonce = Nonces(self)
+        self.snapshots = []
+        self.views = {}
+        self.journal_seen = 0
+        self.headers = deque(maxlen=self.retention)
+        self.pruned_size = 0
 
-    def load_contract(self, frm, code, endowment=0, gas=STARTGAS):
-        _tx = transactions.contract(nonce=self.nonce[frm], gasprice=self.GASPRICE, startgas=gas,
-                                    endowment=endowment, code=code).sign(frm.key)
-        result, contract = processblock.apply_transaction(self.genesis, _tx)
-        assert result
+        # processblock commits the block at the end of every transaction; intercept it to see the storage
+        # changes before the caches are reset
+        self._commit_state = self.genesis.commit_state
+        self.genesis.commit_state = self.commit_state
+        # and del_account, which suicides end in, to drop the deleted contract's storage view
+        self._del_account = self.genesis.del_account
+        self.genesis.del_account = self.del_account
 
+    def commit_state(self, force=False):
+        if self.lazy_state and not force and not self.genesis.suicides:
+            # leave the caches in place; storage views catch up from the journal instead
+            journal = self.genesis.journal
+            for (name, index, _, value) in journal[self.journal_seen:]:
+                if name.startswith('storage:') and name[8:] in self.views:
+                    self.views[name[8:]].update({index: value})
+            self.journal_seen = len(journal)
+            return
+
+        for name, changes in self.genesis.caches.iteritems():
+            if name.startswith('storage:') and name[8:] in self.views:
+                self.views[name[8:]].update(changes)
+        self._commit_state()
+        self.journal_seen = 0
+
+    def del_account(self, address):
+        self._del_account(address)
+        address = address.encode('hex') if len(address) == 20 else address
+        if address in self.views:
+            self.views[address].invalidate()
+
+    # The state and transaction tries are persistent (nodes are never overwritten), so once pending changes
+    # are committed a snapshot is just the pair of root hashes; reverting drops everything written since.
+    def snapshot(self):
+        self.commit_state(force=True)
+        snapshot = {'state': self.genesis.state.root_hash,
+                    'txs': self.genesis.transactions.root_hash,
+                    'nonce': self.nonce.copy()}
+        for attr in self.SNAPSHOT_ATTRS:
+            if hasattr(self.genesis, attr):
+                snapshot[attr] = getattr(self.genesis, attr)
+        self.snapshots.append(snapshot)
+        return len(self.snapshots) - 1
+
+    def revert(self, snapshot_id):
+        self.check_unrecorded('revert')
+        snapshot = self.snapshots[snapshot_id]
+        del self.snapshots[snapshot_id + 1:]
+
+        self.commit_state(force=True)
+        self.genesis.state.root_hash = snapshot['state']
+        self.genesis.transactions.root_hash = snapshot['txs']
+        for attr in self.SNAPSHOT_ATTRS:
+            if attr in snapshot:
+                setattr(self.genesis, attr, snapshot[attr])
+        self.nonce = snapshot['nonce'].copy()
+        while self.headers and self.headers[-1].number >= self.genesis.number:
+            self.headers.pop()
+        for view in self.views.itervalues():
+            view.invalidate()
+
+    # Chain mode: seals the current block and continues in the next one, n times. Sealing only records the
+    # block's header and starts an empty transaction trie; there are no rewards, uncles or proof of work.
+    # sim.genesis stays the block transactions are applied to, so NUMBER, PREVHASH and TIMESTAMP advance as on
+    # a real chain. Only the last retention headers are kept.
+    def mine(self, n=1, timestamp_step=BLOCK_TIME):
+        self.commit_state(force=True)
+        block = self.genesis
+        header = None
+        for _ in xrange(n):
+            header = Header(block.number, utils.sha3(block.serialize_header()), block.prevhash, block.timestamp,
+                            block.state.root_hash, block.transactions.root_hash, block.gas_used)
+            self.headers.append(header)
+            block.prevhash = header.hash
+            block.number += 1
+            block.timestamp += timestamp_step
+            block.gas_used = 0
+            if header.tx_list_root:
+                block.transactions = trie.Trie(utils.get_db_path(), '')
+                block.transaction_count = 0
+        if self.prune_state:
+            self.prune()
+        return header
+
+    def stores(self):
+        stores = [self.genesis.state.db.uncommitted]
+        if state_image.writes is not None:
+            stores.append(state_image.writes)
+        return stores
+
+    # State and transaction roots of the current block, the retained headers and the snapshots
+    def roots(self):
+        roots = [self.genesis.state.root_hash, self.genesis.transactions.root_hash]
+        roots.extend(snapshot['state'] for snapshot in self.snapshots)
+        roots.extend(snapshot['txs'] for snapshot in self.snapshots)
+        for header in self.headers:
+            roots.extend([header.state_root, header.tx_list_root])
+        return roots
+
+    # Drops in-memory trie nodes that are not reachable from the roots of any live Simulator in this process,
+    # so other Simulators sharing the database keep their state. Walking the states costs about as much as
+    # they are large, so this only runs once the stores have grown by half since the last time. Nodes already
+    # written to the database on disk are left alone.
+    def prune(self):
+        size = sum(len(store) for store in self.stores())
+        if size <= self.pruned_size * 3 // 2 + 1024:
+            return 0
+        get = self.genesis.state.db.get
+        keep = {}
+        for sim in list(simulators):
+            for root in sim.roots():
+                if root:
+                    state_image.reachable(get, root, keep)
+
+        pruned = 0
+        for store in self.stores():
+            for key in [key for key in store if key not in keep]:
+                del store[key]
+                pruned += 1
+        self.pruned_size = size - pruned
+        return pruned
+
+    # Forgets snapshot_id and every later snapshot
+    def discard(self, snapshot_id):
+        del self.snapshots[snapshot_id:]
+
+    # processblock.apply_op is only replaced while a hooked Simulator executes, so without hooks there is no
+    # per-op cost at all
+    def execute(self, fn, *args):
+        if not self.hooks:
+            return fn(*args)
+        apply_op = processblock.apply_op
+        processblock.apply_op = hooked_apply_op(apply_op, list(self.hooks))
+        try:
+            return fn(*args)
+        finally:
+            processblock.apply_op = apply_op
+
+    @contextlib.contextmanager
+    def hook(self, hook):
+        self.hooks.append(hook)
+        try:
+            yield hook
+        finally:
+            self.hooks.remove(hook)
+
+    def trace(self, fn, *args, **filters):
+        return tracer.trace(self, fn, *args, **filters)
+
+    def load_contract(self, frm, code, endowment=0, gas=STARTGAS):
+        _tx = self.sign(frm, transactions.contract(nonce=self.nonce[frm], gasprice=self.GASPRICE, startgas=gas,
+                                                   endowment=endowment, code=code))
+        result, contract = self.execute(processblock.apply_transaction, self.genesis, _tx)
+        if self.recorder is not None:
+            self.recorder.create(frm, code, endowment, gas, contract if result else None)
+        # a transaction that was applied used its nonce, even when it failed
         self.nonce[frm] += 1
+        assert result
         return contract
 
+    def sign(self, frm, _tx):
+        if self.signed:
+            return _tx.sign(frm.key)
+        _tx.sender = frm.address
+        return _tx
+
+    # data is anything encode_datalist takes, or a bytearray of calldata that is already encoded
+    def make_tx(self, frm, to, value, data, gas=STARTGAS, nonce=None):
+        return transactions.Transaction(nonce=self.nonce[frm] if nonce is None else nonce, gasprice=self.GASPRICE,
+                                        startgas=gas, to=to, value=value,
+                                        data=str(data) if isinstance(data, bytearray) else encode_datalist(data))
+
     def tx(self, frm, to, value, data, gas=STARTGAS):
-        _tx = transactions.Transaction(nonce=self.nonce[frm], gasprice=self.GASPRICE, startgas=gas,
-                                       to=to, value=value, data=encode_datalist(data)).sign(frm.key)
-        result, ans = processblock.apply_transaction(self.genesis, _tx)
-        assert result
+        return decode_datalist(self.tx_raw(frm, to, value, data, gas))
 
+    # Returns the undecoded output
+    def tx_raw(self, frm, to, value, data, gas=STARTGAS):
+        _tx = self.sign(frm, self.make_tx(frm, to, value, data, gas))
+        result, ans = self.execute(processblock.apply_transaction, self.genesis, _tx)
+        if self.recorder is not None:
+            self.recorder.tx(frm, to, value, _tx.data, gas, decode_datalist(ans) if result else None)
         self.nonce[frm] += 1
-        return decode_datalist(ans)
+        assert result
+        return ans
+
+    # A template for calls to contract with the same shape, e.g. sim.method(contract, "pay", ['address', 'int'])
+    # for ["pay", address, amount]; see call_template.CallTemplate
+    def method(self, contract, name, arg_types, value=0, gas=STARTGAS):
+        return CallTemplate(self, contract, name, arg_types, value, gas)
+
+    def tx_batch(self, calls, errors='raise', processes=None):
+        calls = list(calls)
+        return self.tx_stream(calls, errors=errors, chunk_size=max(len(calls), 1), processes=processes)
+
+    # Applies (frm, to, value, data[, gas]) calls in order and lazily yields the decoded results. Calls are
+    # taken chunk_size at a time, assigned consecutive nonces and signed together, in a process pool when
+    # processes is given. errors='raise' raises TransactionFailed, 'stop' yields it and stops, and 'collect'
+    # yields it in place of the result and carries on.
+    def tx_stream(self, calls, errors='raise', chunk_size=256, processes=None):
+        assert errors in ('raise', 'stop', 'collect')
+        calls = iter(calls)
+        pool = multiprocessing.Pool(processes) if processes and self.signed else None
+        index = 0
+        try:
+            while True:
+                chunk = list(itertools.islice(calls, chunk_size))
+                if not chunk:
+                    return
+
+                nonce = self.nonce.copy()
+                unsigned = []
+                for call in chunk:
+                    unsigned.append((self.make_tx(*call, nonce=nonce[call[0]]), call[0].key))
+                    nonce[call[0]] += 1
+                if pool is not None:
+                    signed = pool.map(sign_transaction, unsigned)
+                else:
+                    signed = [self.sign(call[0], _tx) for (call, (_tx, _)) in zip(chunk, unsigned)]
+
+                for call, _tx in zip(chunk, signed):
+                    frm = call[0]
+                    if _tx.nonce != self.nonce[frm]:
+                        # an earlier transaction from this sender was rejected and did not use its nonce
+                        _tx = self.sign(frm, self.make_tx(*call))
+                    try:
+                        result, ans = self.execute(processblock.apply_transaction, self.genesis, _tx)
+                        self.nonce[frm] += 1
+                        error = None if result else TransactionFailed(index, call)
+                    except processblock.InvalidTransaction as e:
+                        error = TransactionFailed(index, call, e)
+                    index += 1
+
+                    if self.recorder is not None:
+                        self.recorder.tx(frm, _tx.to, _tx.value, _tx.data, _tx.startgas,
+                                         decode_datalist(ans) if error is None else None)
+                    if error is None:
+                        yield decode_datalist(ans)
+                    elif errors == 'raise':
+                        raise error
+                    else:
+                        yield error
+                        if errors == 'stop':
+                            return
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def freeze(self):
+        self.commit_state(force=True)
+        return self.genesis.state.root_hash
+
+    # A copy of the block on top of a committed state root, with its own empty caches. Anything executed
+    # against it is written to those caches only and never committed, so the trie at state_root is untouched.
+    # With base, an earlier overlay, the copy is made of that instead (at base's state root unless state_root
+    # is given), so it does not touch the Simulator's block at all, e.g. while another thread executes on it.
+    def overlay(self, state_root=None, base=None):
+        if base is not None:
+            block = copy.copy(base)
+            state_root = base.state.root_hash if state_root is None else state_root
+        else:
+            if state_root is None:
+                state_root = self.freeze()
+            block = copy.copy(self.genesis)
+            del block.commit_state
+            del block.del_account
+        block.state = trie.Trie(utils.get_db_path(), state_root)
+        block.caches = dict((name, {}) for name in block.caches)
+        block.journal = []
+        block.suicides = []
+        block.postqueue = []
+        return block
+
+    # Executes a message against a throwaway overlay: no signature, no nonce, no gas purchase and no state
+    # changes. Calls passing the same state_root (see freeze) can run concurrently; calls passing base (see
+    # overlay) can run concurrently with writes too.
+    def call(self, frm, to, data, value=0, gas=STARTGAS, state_root=None, base=None):
+        return decode_datalist(self.call_raw(frm, to, data, value, gas, state_root, base))
+
+    def call_raw(self, frm, to, data, value=0, gas=STARTGAS, state_root=None, base=None):
+        block = self.overlay(state_root, base)
+        _tx = self.make_tx(frm, to, value, data, gas, nonce=0)
+        _tx.sender = frm.address
+        msg = processblock.Message(frm.address, to, value, gas, _tx.data)
+        result, _, ans = self.execute(processblock.apply_msg_send, block, _tx, msg)
+        if not result:
+            raise TransactionFailed(None, (frm, to, value, data, gas))
+        return ''.join(map(chr, ans))
+
+    # Writes accounts straight into the block caches (see state_loader.records for the accepted sources) and
+    # commits them once at the end, so the tries and the state root are only updated once for the whole load.
+    # Nonces of Keys that already sent transactions are kept in sync; other Keys read theirs from the state.
+    def load_state(self, source):
+        self.check_unrecorded('load_state')
+        nonces = {}
+        count = 0
+        for address, account in state_loader.records(source):
+            if 'balance' in account:
+                self.genesis.set_balance(address, account['balance'])
+            if 'nonce' in account:
+                self.genesis.set_nonce(address, account['nonce'])
+                nonces[address] = account['nonce']
+            if 'code' in account:
+                self.genesis.set_code(address, account['code'])
+            for index, value in account['storage'].iteritems():
+                self.genesis.set_storage_data(address, index, value)
+            count += 1
+        self.genesis.commit_state()
+
+        for frm in self.nonce:
+            if frm.address in nonces:
+                self.nonce[frm] = nonces[frm.address]
+        return count
+
+    def save_image(self, path):
+        return state_image.save(path, self.freeze(), self.genesis.timestamp, self.genesis.state.db.get)
+
+    # Trie nodes are read lazily from the memory-mapped image, and from then on this process' writes stay in
+    # memory (see state_image.isolate_db), so one image can be shared by any number of processes. Nonces are
+    # read back from the state for the given keys.
+    def load_image(self, path, keys=()):
+        self.check_unrecorded('load_image')
+        image = state_image.load(path)
+        self.commit_state(force=True)
+        self.genesis.state.root_hash = image.state_root
+        self.genesis.timestamp = image.timestamp
+        self.nonce = Nonces(self, dict((key, self.genesis.get_nonce(key.address)) for key in keys))
+        self.snapshots = []
+        for view in self.views.itervalues():
+            view.invalidate()
+        return image
 
     def get_storage_data(self, contract, index):
         return self.genesis.get_storage_data(contract, index)
 
+    def storage(self, contract):
+        if contract not in self.views:
+            view = CompactStorageView if self.compact_storage else StorageView
+            self.views[contract] = view(self, contract)
+        return self.views[contract]
+
     def get_storage_dict(self, contract):
         return {k[2:].decode('hex'): v[2:].decode('hex')
                 for (k, v) in self.genesis.account_to_dict(contract).get('storage').iteritems()}
+
+    # Commits pending changes and breaks down what the state holds: per account the storage slots, the storage
+    # trie nodes and their bytes and the code size; totals for the account trie itself, storage and code;
+    # and the Python memory held by in-memory database entries and storage views. Storage tries with
+    # identical nodes are counted for each account but only once in the totals.
+    def memory_report(self):
+        get = self.genesis.state.db.get
+        nodes = state_image.reachable(get, self.freeze())
+        accounts = {}
+        storage_nodes = {}
+        code_hashes = set()
+        for address, data in self.genesis.state.to_dict().iteritems():
+            address = address.encode('hex')
+            storage_root, code_hash = rlp.decode(data)[2:4]
+            storage = state_image.reachable(get, storage_root) if storage_root else {}
+            storage_nodes.update(storage)
+            code_hashes.add(code_hash)
+            accounts[address] = {'storage_slots': len(self.genesis.get_storage(address).to_dict()),
+                                 'storage_nodes': len(storage),
+                                 'storage_bytes': sum(len(value) for value in storage.itervalues()),
+                                 'code_bytes': len(self.genesis.get_code(address))}
+
+        code = [key for key in code_hashes if key in nodes and key not in storage_nodes]
+        trie_nodes = [key for key in nodes if key not in storage_nodes and key not in code_hashes]
+        db_bytes = sum(sys.getsizeof(store) + sum(sys.getsizeof(k) + sys.getsizeof(v) for (k, v) in store.iteritems())
+                       for store in self.stores())
+        return {'accounts': accounts,
+                'state_trie': {'nodes': len(trie_nodes), 'bytes': sum(len(nodes[key]) for key in trie_nodes)},
+                'storage': {'slots': sum(account['storage_slots'] for account in accounts.itervalues()),
+                            'nodes': len(storage_nodes),
+                            'bytes': sum(len(value) for value in storage_nodes.itervalues())},
+                'code': {'bytes': sum(len(nodes[key]) for key in code)},
+                'memory': {'db': db_bytes,
+                           'views': sum(view.size() for view in self.views.itervalues())}}
@@ -0,0 +1,165 @@
+import mmap
+import struct
+
+from pyethereum import db, rlp
+
+MAGIC = 'EVMSIMG1'
+HEADER = struct.Struct('>8s32sQQ')  # magic, state root, timestamp, number of nodes
+ENTRY = struct.Struct('>32sQI')  # key, data offset, length; sorted by key
+
+layers = []
+writes = None
+original = None
+restore_on_close = False  # isolated by load(): closing the last image restores the database
+
+
+# Makes every database in this process copy-on-write: commits go to a process-local dict, and reads fall
+# through to the loaded images and then to the database on disk. Trie nodes are content addressed, so this is
+# safe to do at any time, e.g. right after a fork. Undone by restore_db.
+def isolate_db():
+    global writes, original
+    if writes is not None:
+        return
+    writes = {}
+    original = (db.DB.get, db.DB.commit)
+
+    def get(self, key):
+        if key in self.uncommitted:
+            return self.uncommitted[key]
+        if key in writes:
+            return writes[key]
+        for image in layers:
+            value = image.get(key)
+            if value is not None:
+                return value
+        return self.db.Get(key)
+
+    def commit(self):
+        writes.update(self.uncommitted)
+
+    db.DB.get = get
+    db.DB.commit = commit
+
+
+# Puts back the database methods replaced by isolate_db and closes every loaded image. Nodes committed while
+# isolated are still in the databases' uncommitted dicts (the isolated commit leaves them there), so they are
+# written to disk by the next commit.
+def restore_db():
+    global writes, original, restore_on_close
+    while layers:
+        layers.pop().map.close()
+    if writes is None:
+        return
+    db.DB.get, db.DB.commit = original
+    writes = original = None
+    restore_on_close = False
+
+
+# Anything inside a node that might be the key of another database entry: 32 byte strings, found by walking
+# the node's rlp and any rlp-encoded lists (accounts) embedded in it
+def references(value):
+    items = [value]
+    while items:
+        item = items.pop()
+        if isinstance(item, list):
+            items.extend(item)
+        elif len(item) == 32:
+            yield item
+        elif item and ord(item[0]) >= 0xc0:
+            try:
+                items.append(rlp.decode(item))
+            except Exception:
+                pass
+
+
+# All database entries reachable from state_root: state trie nodes, accounts' storage tries and code. Pass
+# the result of an earlier call as nodes to collect several roots without walking shared subtries twice.
+def reachable(get, state_root, nodes=None):
+    nodes = {} if nodes is None else nodes
+    pending = [state_root]
+    while pending:
+        key = pending.pop()
+        if key in nodes:
+            continue
+        try:
+            value = get(key)
+        except KeyError:
+            continue
+        if value is None:
+            continue
+        nodes[key] = value
+        try:
+            pending.extend(references(rlp.decode(value)))
+        except Exception:
+            pass  # code, not a node
+    return nodes
+
+
+def save(path, state_root, timestamp, get):
+    nodes = reachable(get, state_root)
+    keys = sorted(nodes)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, state_root, timestamp, len(keys)))
+        offset = 0
+        for key in keys:
+            f.write(ENTRY.pack(key, offset, len(nodes[key])))
+            offset += len(nodes[key])
+        for key in keys:
+            f.write(nodes[key])
+    return len(keys)
+
+
+# Read-only, memory-mapped image; lookups binary search the index, so only the pages touched are read
+class StateImage(object):
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.state_root, self.timestamp, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a state image" % path)
+        self.data = HEADER.size + self.count * ENTRY.size
+
+    def entry(self, i):
+        return ENTRY.unpack_from(self.map, HEADER.size + i * ENTRY.size)
+
+    def get(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count:
+            return None
+        found, offset, length = self.entry(lo)
+        if found != key:
+            return None
+        return self.map[self.data + offset:self.data + offset + length]
+
+    def close(self):
+        if self in layers:
+            layers.remove(self)
+            if restore_on_close and not layers:
+                restore_db()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Loads an image as a read-through layer, isolating the database first if needed. When this isolated it,
+# closing the last loaded image undoes that again (see restore_db).
+def load(path):
+    global restore_on_close
+    image = StateImage(path)
+    if writes is None:
+        isolate_db()
+        restore_on_close = True
+    layers.append(image)
+    return image
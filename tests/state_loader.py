@@ -0,0 +1,66 @@
+import csv
+import json
+
+
+# ints, 0x-prefixed hex, 40 character hex addresses (as in utils.coerce_to_int) or decimal strings
+def parse_int(value):
+    if isinstance(value, (int, long)):
+        return value
+    value = value.strip()
+    if value.startswith('0x'):
+        return int(value[2:], 16)
+    return int(value, 16) if len(value) == 40 else int(value)
+
+
+def parse_code(value):
+    value = value.strip()
+    return (value[2:] if value.startswith('0x') else value).decode('hex')
+
+
+def normalize(record, from_file=False):
+    account = {}
+    for field in ('balance', 'nonce'):
+        if record.get(field) not in (None, ''):
+            account[field] = parse_int(record[field])
+    if record.get('code') not in (None, ''):
+        account['code'] = parse_code(record['code']) if from_file else record['code']
+    account['storage'] = dict((parse_int(k), parse_int(v)) for (k, v) in record.get('storage', {}).iteritems())
+    return account
+
+
+# One row per account and/or storage slot: address,balance,nonce,code,slot,value. Empty cells are skipped, so
+# an account's fields and its slots can be on separate rows.
+def read_csv(filename):
+    with open(filename) as f:
+        for row in csv.DictReader(f):
+            record = dict(row)
+            if row.get('slot') not in (None, ''):
+                record['storage'] = {row['slot']: row['value']}
+            yield row['address'], normalize(record, from_file=True)
+
+
+# One JSON object per line: {"address": ..., "balance": ..., "nonce": ..., "code": "0x...", "storage": {...}}
+def read_jsonl(filename):
+    with open(filename) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield str(record['address']), normalize(record, from_file=True)
+
+
+# Yields (address, account) pairs from a dict of address -> account, an iterable of such pairs or of dicts
+# with an 'address' key, or a .csv/.jsonl file. Numbers and slots may be ints or strings (see parse_int).
+def records(source):
+    if isinstance(source, basestring):
+        reader = read_csv if source.endswith('.csv') else read_jsonl
+        for record in reader(source):
+            yield record
+        return
+    if isinstance(source, dict):
+        source = source.iteritems()
+    for item in source:
+        if isinstance(item, dict):
+            yield item['address'], normalize(item)
+        else:
+            address, account = item
+            yield address, normalize(account)
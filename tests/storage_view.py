@@ -0,0 +1,237 @@
+import bisect
+import sys
+
+from pyethereum import rlp, utils
+
+from call_template import WORD, WORDS, pack_int
+
+
+# Decoded, sorted index of a contract's storage slots. Built with a single trie walk on first access and then
+# kept up to date from the block's storage caches whenever the Simulator commits state.
+class StorageView(object):
+
+    def __init__(self, sim, contract):
+        self.sim = sim
+        self.contract = contract
+        self.slots = {}
+        self.keys = []
+        self.stale = True
+
+    def invalidate(self):
+        self.stale = True
+
+    def rebuild(self):
+        storage = self.sim.genesis.account_to_dict(self.contract).get('storage')
+        self.slots = dict((utils.big_endian_to_int(k[2:].decode('hex')), utils.big_endian_to_int(v[2:].decode('hex')))
+                          for (k, v) in storage.iteritems())
+        self.keys = sorted(self.slots)
+        self.stale = False
+
+    def index(self):
+        if self.stale:
+            self.rebuild()
+        return self.slots
+
+    def update(self, changes):
+        if self.stale:
+            return
+        for index, value in changes.iteritems():
+            key = utils.coerce_to_int(index)
+            if value:
+                if key not in self.slots:
+                    bisect.insort(self.keys, key)
+                self.slots[key] = value
+            elif key in self.slots:
+                del self.slots[key]
+                del self.keys[bisect.bisect_left(self.keys, key)]
+
+    def get(self, key):
+        return self.index().get(utils.coerce_to_int(key), 0)
+
+    def get_many(self, keys):
+        slots = self.index()
+        return [slots.get(utils.coerce_to_int(key), 0) for key in keys]
+
+    # Non-zero slots with start <= key < stop in key order, skipping the first offset and returning at most
+    # limit of them.
+    def range(self, start=None, stop=None, offset=0, limit=None):
+        slots = self.index()
+        lo = 0 if start is None else bisect.bisect_left(self.keys, utils.coerce_to_int(start))
+        hi = len(self.keys) if stop is None else bisect.bisect_left(self.keys, utils.coerce_to_int(stop))
+        lo = min(lo + offset, hi)
+        if limit is not None:
+            hi = min(lo + limit, hi)
+        return [(key, slots[key]) for key in self.keys[lo:hi]]
+
+    def items(self):
+        slots = self.index()
+        for key in self.keys:
+            yield key, slots[key]
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __contains__(self, key):
+        return utils.coerce_to_int(key) in self.index()
+
+    def __iter__(self):
+        self.index()
+        return iter(self.keys)
+
+    def __len__(self):
+        return len(self.index())
+
+    # Approximate bytes held by the decoded slots
+    def size(self):
+        slots = self.index()
+        return (sys.getsizeof(slots) + sys.getsizeof(self.keys) +
+                sum(sys.getsizeof(key) + sys.getsizeof(value) for (key, value) in slots.iteritems()))
+
+
+def to_word(value):
+    buf = bytearray(WORD)
+    pack_int(buf, 0, value)
+    return str(buf)
+
+
+def from_word(data, index):
+    a, b, c, d = WORDS.unpack_from(data, index * WORD)
+    return (a << 192) | (b << 128) | (c << 64) | d
+
+
+# The same interface as StorageView with the slots packed as 32 byte big-endian words into two bytearrays,
+# keys in order and values at the same positions, found by binary search. That costs 64 bytes per slot instead
+# of a dict entry and two longs. It is also built straight from the storage trie rather than from the
+# hex-encoded account_to_dict. Updates are collected and only merged into the arrays on the next access, in a
+# single pass however many slots were inserted or deleted. Only the view is compact: the storage trie it is
+# read from is unchanged.
+class CompactStorageView(object):
+
+    __slots__ = ('sim', 'contract', 'slot_keys', 'slot_values', 'pending', 'stale')
+
+    def __init__(self, sim, contract):
+        self.sim = sim
+        self.contract = contract
+        self.slot_keys = bytearray()
+        self.slot_values = bytearray()
+        self.pending = {}
+        self.stale = True
+
+    def invalidate(self):
+        self.stale = True
+
+    def rebuild(self):
+        block = self.sim.genesis
+        slots = dict((utils.big_endian_to_int(k), utils.big_endian_to_int(rlp.decode(v)))
+                     for (k, v) in block.get_storage(self.contract).to_dict().iteritems())
+        for index, value in block.caches.get('storage:' + self.contract, {}).iteritems():
+            slots[utils.coerce_to_int(index)] = value
+        keys = sorted(key for key in slots if slots[key])
+        self.slot_keys = bytearray(''.join(to_word(key) for key in keys))
+        self.slot_values = bytearray(''.join(to_word(slots[key]) for key in keys))
+        self.pending = {}
+        self.stale = False
+
+    def load(self):
+        if self.stale:
+            self.rebuild()
+        elif self.pending:
+            self.merge()
+
+    # Applies the pending updates: values of existing slots are overwritten in place, and inserted and deleted
+    # slots are merged in while copying the arrays once
+    def merge(self):
+        pending, self.pending = self.pending, {}
+        changed = {}
+        for key, value in pending.iteritems():
+            i, found = self.position(key)
+            if found and value:
+                pack_int(self.slot_values, i * WORD, value)
+            elif found or value:
+                changed[key] = value
+        if not changed:
+            return
+        keys, values = bytearray(), bytearray()
+        i = 0
+        for key in sorted(changed):
+            word = to_word(key)
+            j = self.find(word)
+            keys += self.slot_keys[i * WORD:j * WORD]
+            values += self.slot_values[i * WORD:j * WORD]
+            if changed[key]:
+                keys += word
+                values += to_word(changed[key])
+                i = j
+            else:
+                i = j + 1
+        keys += self.slot_keys[i * WORD:]
+        values += self.slot_values[i * WORD:]
+        self.slot_keys, self.slot_values = keys, values
+
+    # Position of the first key >= word
+    def find(self, word):
+        keys = self.slot_keys
+        lo, hi = 0, len(keys) // WORD
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[mid * WORD:(mid + 1) * WORD] < word:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def position(self, key):
+        word = to_word(utils.coerce_to_int(key))
+        i = self.find(word)
+        return i, self.slot_keys[i * WORD:(i + 1) * WORD] == word
+
+    def update(self, changes):
+        if self.stale:
+            return
+        for index, value in changes.iteritems():
+            self.pending[utils.coerce_to_int(index)] = value
+
+    def get(self, key):
+        self.load()
+        i, found = self.position(key)
+        return from_word(self.slot_values, i) if found else 0
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def range(self, start=None, stop=None, offset=0, limit=None):
+        self.load()
+        lo = 0 if start is None else self.find(to_word(utils.coerce_to_int(start)))
+        hi = len(self) if stop is None else self.find(to_word(utils.coerce_to_int(stop)))
+        lo = min(lo + offset, hi)
+        if limit is not None:
+            hi = min(lo + limit, hi)
+        return [(from_word(self.slot_keys, i), from_word(self.slot_values, i)) for i in range(lo, hi)]
+
+    def items(self):
+        self.load()
+        for i in range(len(self)):
+            yield from_word(self.slot_keys, i), from_word(self.slot_values, i)
+
+    # A dict of all slots, as StorageView.index(); this gives up the compactness for as long as it is kept
+    def index(self):
+        return dict(self.items())
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __contains__(self, key):
+        self.load()
+        return self.position(key)[1]
+
+    def __iter__(self):
+        self.load()
+        return (from_word(self.slot_keys, i) for i in range(len(self)))
+
+    def __len__(self):
+        self.load()
+        return len(self.slot_keys) // WORD
+
+    def size(self):
+        self.load()
+        return sys.getsizeof(self.slot_keys) + sys.getsizeof(self.slot_values)
@@ -0,0 +1,72 @@
+from sim import Key, Simulator, compile_serpent
+from call_template import LazyResult
+from serpent import encode_datalist, decode_datalist
+
+import logging
+import pytest
+
+
+class TestCallTemplate(object):
+
+    ALICE = Key('cow')
+    BOB = Key('cat')
+
+    @classmethod
+    def setup_class(cls):
+        logging.disable(logging.INFO)
+        cls.sim = Simulator({cls.ALICE.address: 10**18, cls.BOB.address: 10**18})
+        cls.mutuala = cls.sim.load_contract(cls.ALICE, compile_serpent('examples/mutuala.se'), gas=100000)
+        cls.subcurrency = cls.sim.load_contract(cls.ALICE, compile_serpent('examples/subcurrency.se'))
+        cls.snapshot = cls.sim.snapshot()
+
+    def setup_method(self, method):
+        self.sim.revert(self.snapshot)
+
+    def test_encode_matches_datalist(self):
+        pay = self.sim.method(self.mutuala, 'pay', ['address', 'int'])
+        for amount in [0, 1, 1000, 2**64, 2**200 + 5, 2**256 - 1]:
+            assert pay.encode(self.BOB.address, amount) == encode_datalist(['pay', self.BOB.address, amount])
+        assert pay.encode(int(self.BOB.address, 16), -1) == encode_datalist(['pay', self.BOB.address, 2**256 - 1])
+
+        propose = self.sim.method(self.mutuala, 'propose', ['value', 'address', 'int'])
+        assert (propose.encode('grant to bob', self.BOB.address, 10) ==
+                encode_datalist(['propose', 'grant to bob', self.BOB.address, 10]))
+
+        transfer = self.sim.method(self.subcurrency, None, ['address', 'int'])
+        assert transfer.encode(self.BOB.address, 5) == encode_datalist([self.BOB.address, 5])
+
+    def test_encode_rejects_wrong_lengths(self):
+        propose = self.sim.method(self.mutuala, 'propose', ['value', 'address', 'int'])
+        expected = propose.encode('grant to bob', self.BOB.address, 10)
+        with pytest.raises(ValueError):
+            propose.encode('grant to bob', self.BOB.address[2:], 10)
+        with pytest.raises(ValueError):
+            propose.encode('x' * 33, self.BOB.address, 10)
+        # the template is unaffected
+        assert propose.encode('grant to bob', self.BOB.address, 10) == expected
+
+    def test_lazy_result(self):
+        data = encode_datalist([1, 2**255, 3])
+        result = LazyResult(data)
+        assert len(result) == 3
+        assert result[1] == 2**255
+        assert result[-1] == 3
+        assert result[1:] == [2**255, 3]
+        assert result == decode_datalist(data)
+        assert result != [1]
+
+    def test_transactions(self):
+        transfer = self.sim.method(self.subcurrency, None, ['address', 'int'])
+        assert transfer(self.ALICE, self.BOB.address, 1000) == [1]
+        assert transfer(self.BOB, self.ALICE.address, 5000) == [0]
+        assert self.sim.get_storage_data(self.subcurrency, self.BOB.address) == 1000
+
+        pay = self.sim.method(self.mutuala, 'pay', ['address', 'int'], gas=100000)
+        assert pay(self.ALICE, self.BOB.address, 1000) == [0]
+        assert self.sim.method(self.mutuala, 'balance', ['address']).call(self.ALICE, self.BOB.address) == [0, 1000]
+
+    def test_raw_calldata(self):
+        # a bytearray is sent as is, anything else goes through encode_datalist
+        data = bytearray(encode_datalist([self.BOB.address, 1000]))
+        assert self.sim.tx(self.ALICE, self.subcurrency, 0, data) == [1]
+        assert self.sim.call(self.ALICE, self.subcurrency, [self.BOB.address]) == [1000]
@@ -0,0 +1,75 @@
+from sim import Key, Simulator, compile_serpent
+from pyethereum.utils import coerce_to_bytes
+
+import logging
+
+
+class TestChain(object):
+
+    ALICE = Key('cow')
+    BOB = Key('cat')
+
+    @classmethod
+    def setup_class(cls):
+        logging.disable(logging.INFO)
+        cls.code = compile_serpent('examples/mutuala.se')
+
+    def setup_method(self, method):
+        self.sim = Simulator({self.ALICE.address: 10**18, self.BOB.address: 10**18}, retention=10)
+        self.contract = self.sim.load_contract(self.ALICE, self.code, gas=100000)
+
+    def test_mine(self):
+        number, timestamp = self.sim.genesis.number, self.sim.genesis.timestamp
+        header = self.sim.mine()
+        assert header.number == number
+        assert header.gas_used > 0
+        assert header.state_root == self.sim.genesis.state.root_hash
+        assert self.sim.genesis.number == number + 1
+        assert self.sim.genesis.timestamp == timestamp + Simulator.BLOCK_TIME
+        assert self.sim.genesis.prevhash == header.hash
+        assert self.sim.genesis.gas_used == 0
+
+    def test_headers_are_linked_and_retained(self):
+        self.sim.mine(25, timestamp_step=60)
+        headers = list(self.sim.headers)
+        assert len(headers) == 10
+        assert [h.number for h in headers] == range(self.sim.genesis.number - 10, self.sim.genesis.number)
+        for parent, child in zip(headers, headers[1:]):
+            assert child.prevhash == parent.hash
+            assert child.timestamp == parent.timestamp + 60
+
+    def test_tick_after_a_month_of_blocks(self):
+        self.sim.mine(30, timestamp_step=86400)
+        ans = self.sim.tx(self.ALICE, self.contract, 0, ["tick"])
+        assert ans == [0, 1]
+        assert self.sim.get_storage_data(self.contract, coerce_to_bytes(42)) == 4106776170
+
+    def test_revert_drops_mined_blocks(self):
+        self.sim.mine(2)
+        snapshot = self.sim.snapshot()
+        number, prevhash = self.sim.genesis.number, self.sim.genesis.prevhash
+        self.sim.mine(5)
+        self.sim.revert(snapshot)
+        assert self.sim.genesis.number == number
+        assert self.sim.genesis.prevhash == prevhash
+        assert self.sim.headers[-1].number == number - 1
+
+    def test_prune_keeps_state(self):
+        sim = Simulator({self.ALICE.address: 10**18}, retention=2, prune_state=True)
+        contract = sim.load_contract(self.ALICE, self.code, gas=100000)
+        for n in range(20):
+            sim.tx(self.ALICE, contract, 0, ["pay", '%040x' % (n + 1), 1000], gas=100000)
+            sim.mine()
+        sim.prune()
+        assert sim.genesis.get_balance(self.ALICE.address) > 0
+        assert sim.get_storage_data(contract, coerce_to_bytes(2**160 - 1)) == 21
+
+    def test_prune_keeps_other_simulators_state(self):
+        self.sim.tx(self.ALICE, self.contract, 0, ["pay", self.BOB.address, 1000], gas=100000)
+        snapshot = self.sim.snapshot()
+        sim = Simulator({self.ALICE.address: 10**18}, prune_state=True)
+        sim.pruned_size = -10**9  # prune regardless of how much was written
+        assert sim.prune() > 0
+        assert self.sim.get_storage_data(self.contract, coerce_to_bytes(2**161 + int(self.BOB.address, 16))) == 1000
+        self.sim.revert(snapshot)
+        assert self.sim.tx(self.ALICE, self.contract, 0, ["balance", self.BOB.address], gas=100000) == [0, 1000]
@@ -0,0 +1,62 @@
+import os
+
+from compile_cache import CompileCache
+
+
+class TestCompileCache(object):
+
+    def setup_method(self, method):
+        self.calls = []
+
+    def compiler(self, cmd, args, filename):
+        self.calls.append(filename)
+        return '\x60\x0a'
+
+    def test_hit_after_miss(self, tmpdir):
+        source = tmpdir.join('returnten.se')
+        source.write('return(10)')
+        cache = CompileCache(str(tmpdir.join('cache')))
+
+        assert cache.compile('serpent', ['compile'], str(source), self.compiler) == '\x60\x0a'
+        assert cache.compile('serpent', ['compile'], str(source), self.compiler) == '\x60\x0a'
+        assert len(self.calls) == 1
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 0}
+
+    def test_key_depends_on_source_and_args(self, tmpdir):
+        cache = CompileCache(str(tmpdir))
+        key = cache.key('serpent', ['compile'], 'return(10)')
+        assert key != cache.key('serpent', ['compile'], 'return(11)')
+        assert key != cache.key('serpent', ['compile_lll'], 'return(10)')
+        assert key != cache.key('lllc', ['compile'], 'return(10)')
+        assert key != cache.key('serpent', ['compile'], 'return(10)', version='1.0')
+
+    def test_shared_between_instances(self, tmpdir):
+        source = tmpdir.join('returnten.se')
+        source.write('return(10)')
+        CompileCache(str(tmpdir.join('cache'))).compile('serpent', ['compile'], str(source), self.compiler)
+        CompileCache(str(tmpdir.join('cache'))).compile('serpent', ['compile'], str(source), self.compiler)
+        assert len(self.calls) == 1
+
+    def test_lru_eviction(self, tmpdir):
+        cache = CompileCache(str(tmpdir), max_size=20)
+        cache.put('aa01', 'x' * 10)
+        cache.put('aa02', 'x' * 10)
+        os.utime(cache.entry_path('aa01'), (1000, 1000))
+        os.utime(cache.entry_path('aa02'), (2000, 2000))
+        cache.get('aa01')
+        cache.put('aa03', 'x' * 10)
+        assert cache.evictions == 1
+        assert cache.get('aa01') is not None
+        assert cache.get('aa02') is None
+
+    def test_walks_only_when_over_size(self, tmpdir):
+        cache = CompileCache(str(tmpdir), max_size=35)
+        walks = []
+        entries = cache.entries
+        cache.entries = lambda: walks.append(1) or entries()
+        for n in range(3):
+            cache.put('aa0%d' % n, 'x' * 10)
+        assert len(walks) == 1  # the first put measures the cache, the others count
+        cache.put('aa03', 'x' * 10)
+        assert len(walks) == 2 and cache.evictions == 1
+        assert cache.total == 30
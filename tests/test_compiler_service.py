@@ -0,0 +1,65 @@
+from compiler_service import CompilerService
+
+import os
+
+
+def compile_with_pid(filename):
+    return str(os.getpid())
+
+
+class TestCompilerService(object):
+
+    def setup_method(self, method):
+        self.calls = []
+        self.service = CompilerService({'.se': self.compiler})
+
+    def compiler(self, filename):
+        self.calls.append(filename)
+        if 'broken' in filename:
+            raise ValueError(filename)
+        return '\x60\x0a'
+
+    def test_compiled_once(self, tmpdir):
+        source = tmpdir.join('returnten.se')
+        source.write('return(10)')
+        assert self.service.compile(str(source)) == '\x60\x0a'
+        assert self.service.compile(str(source)) == '\x60\x0a'
+        assert len(self.calls) == 1
+
+    def test_recompiled_when_modified(self, tmpdir):
+        source = tmpdir.join('returnten.se')
+        source.write('return(10)')
+        self.service.compile(str(source))
+        source.setmtime(source.mtime() + 10)
+        self.service.compile(str(source))
+        assert len(self.calls) == 2
+
+    def test_warm_up(self, tmpdir):
+        for name in ['a.se', 'b.se', 'broken.se', 'c.lll']:
+            tmpdir.join(name).write('return(10)')
+        errors = self.service.warm_up(str(tmpdir))
+        assert sorted(self.calls) == sorted(str(tmpdir.join(name)) for name in ['a.se', 'b.se', 'broken.se'])
+        assert [name for (name, error) in errors.items() if error is not None] == [str(tmpdir.join('broken.se'))]
+
+        assert self.service.compile(str(tmpdir.join('a.se'))) == '\x60\x0a'
+        try:
+            self.service.compile(str(tmpdir.join('broken.se')))
+            assert False
+        except ValueError:
+            pass
+        assert len(self.calls) == 3
+
+    def test_warm_up_files(self, tmpdir):
+        for name in ['a.se', 'b.se', 'c.lll']:
+            tmpdir.join(name).write('return(10)')
+        filenames = [str(tmpdir.join(name)) for name in ['a.se', 'c.lll']]
+        assert self.service.warm_up(filenames) == {filenames[0]: None}
+        assert self.calls == [filenames[0]]
+
+    def test_warm_up_gil_bound_in_processes(self, tmpdir):
+        service = CompilerService({'.se': compile_with_pid, '.lll': self.compiler}, gil_bound=[compile_with_pid])
+        for name in ['a.se', 'b.lll']:
+            tmpdir.join(name).write('return(10)')
+        assert service.warm_up(str(tmpdir)) == {str(tmpdir.join('a.se')): None, str(tmpdir.join('b.lll')): None}
+        assert service.compile(str(tmpdir.join('a.se'))) != str(os.getpid())
+        assert self.calls == [str(tmpdir.join('b.lll'))]
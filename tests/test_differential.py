@@ -0,0 +1,40 @@
+from sim import Key, compile_serpent, compile_mutan
+from differential import Differential, Variant
+
+import logging
+
+
+class TestDifferential(object):
+
+    ALICE = Key('cow')
+    BOB = Key('cat')
+    CHARLIE = Key('car')
+
+    @classmethod
+    def setup_class(cls):
+        logging.disable(logging.INFO)
+        cls.differential = Differential([Variant('serpent', 'examples/subcurrency.se', compile_serpent),
+                                         Variant('mutan', 'examples/subcurrency.mu', compile_mutan)],
+                                        {cls.ALICE.address: 10**18, cls.BOB.address: 10**18,
+                                         cls.CHARLIE.address: 10**18}, cls.ALICE)
+
+    def test_equivalent(self):
+        report = self.differential.run([(self.ALICE, [self.BOB.address, 1000]),
+                                        (self.BOB, [self.CHARLIE.address, 250]),
+                                        (self.CHARLIE, [self.BOB.address, 1000])])
+        assert report.mismatches == []
+        # every call went through, so equal results are the contracts' own
+        assert all(step[0] is not None for run in report.runs.itervalues() for step in run['steps'])
+        assert [step[0] for step in report.runs['serpent']['steps']] == [[1], [1], [0]]
+        assert report.runs['serpent']['steps'][0][:2] == ([1], {int(self.ALICE.address, 16): 999000,
+                                                                int(self.BOB.address, 16): 1000})
+        assert [row[0] for row in report.rows()] == ['serpent', 'mutan']
+        assert all(row[2] > 0 for row in report.rows())
+        assert 'MISMATCH' not in str(report)
+
+    def test_transfer_of_whole_balance(self):
+        # subcurrency.se allows sending the whole balance (>=), subcurrency.mu does not (>)
+        report = self.differential.run([(self.ALICE, [self.BOB.address, 1000]),
+                                        (self.BOB, [self.CHARLIE.address, 1000])])
+        assert [(m.step, m.field) for m in report.mismatches] == [(1, 'result'), (1, 'storage')]
+        assert report.mismatches[0].values == {'serpent': [1], 'mutan': [0]}
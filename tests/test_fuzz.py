@@ -0,0 +1,43 @@
+from sim import Key, compile_serpent
+from fuzz import Call, Fuzzer, choice, integers
+
+ALICE = Key('cow')
+BOB = Key('cat')
+CHARLIE = Key('car')
+FOUNDERS = {ALICE.address: 10**18, BOB.address: 10**18, CHARLIE.address: 10**18}
+
+
+def deploy(sim):
+    return sim.load_contract(ALICE, compile_serpent('examples/subcurrency.se'))
+
+
+def balances(sim, contract):
+    return sim.storage(contract).get_many([ALICE.address, BOB.address, CHARLIE.address])
+
+
+def total_supply(sim, contract):
+    return sum(balances(sim, contract)) == 1000000
+
+
+def charlie_has_nothing(sim, contract):
+    assert balances(sim, contract)[2] == 0
+
+
+class TestFuzzer(object):
+
+    def test_conservation(self):
+        addresses = [ALICE.address, BOB.address, CHARLIE.address]
+        grammar = [Call([ALICE, BOB, CHARLIE], [choice(addresses), integers(0, 2000000)])]
+        report = Fuzzer(grammar, [total_supply], length=20).run(FOUNDERS, deploy, range(4), processes=2)
+        assert report.failures == []
+        assert report.executed == 80
+        assert report.tx_per_second > 0
+
+    def test_shrink(self):
+        grammar = [Call([ALICE], [BOB.address, 10], weight=5),
+                   Call([BOB], [CHARLIE.address, integers(1, 10)])]
+        report = Fuzzer(grammar, [charlie_has_nothing], length=20).run(FOUNDERS, deploy, range(4), processes=2)
+        assert report.failures
+        for failure in report.failures:
+            assert failure.invariant == 'charlie_has_nothing'
+            assert [frm.address for (_, frm, _) in failure.steps] == [ALICE.address, BOB.address]
@@ -0,0 +1,40 @@
+from sim import Key, Simulator, compile_serpent, compile_lll, compile_mutan
+
+import pytest
+
+ALICE = Key('cow')
+BOB = Key('cat')
+CHARLIE = Key('car')
+
+SCENARIOS = [
+    ('examples/namecoin.se', compile_serpent, [['ethereum.bit', '127.0.0.1'], ['ethereum.bit', '127.0.0.2']]),
+    ('examples/subcurrency.se', compile_serpent, [[BOB.address, 1000], [CHARLIE.address, 250]]),
+    ('examples/subcurrency.mu', compile_mutan, [[BOB.address, 1000], [CHARLIE.address, 250]]),
+    ('examples/returnten.se', compile_serpent, [[]]),
+    ('examples/datafeed.se', compile_serpent, [['key1', 'value1', 'key2', 'value2'], ['key1']]),
+    ('examples/hash.se', compile_serpent, [['hash', 'grant to bob']]),
+    ('examples/keyval_publisher.lll', compile_lll, [['key', 'value'], ['key', 0]]),
+    ('examples/mutuala.se', compile_serpent, [['pay', BOB.address, 1000], ['tick'], ['pay', CHARLIE.address, 10],
+                                              ['propose', 'grant to bob', BOB.address, 10]]),
+]
+
+
+def run(code, calls, lazy_state):
+    sim = Simulator({ALICE.address: 10**18, BOB.address: 10**18}, lazy_state=lazy_state)
+    contract = sim.load_contract(ALICE, code, gas=100000)
+    results = []
+    for data in calls:
+        sim.genesis.timestamp += 86400
+        results.append(sim.tx(ALICE, contract, 0, data, gas=100000))
+    return results, sim.get_storage_dict(contract), sim.freeze(), sim.genesis.transactions.root_hash
+
+
+class TestLazyState(object):
+
+    @pytest.mark.parametrize(('filename', 'compiler', 'calls'), SCENARIOS)
+    def test_same_state_root(self, filename, compiler, calls):
+        code = compiler(filename)
+        lazy, eager = run(code, calls, True), run(code, calls, False)
+        assert lazy[:3] == eager[:3]
+        # the transaction list stores the state root after every transaction, which lazy mode does not compute
+        assert lazy[3] != eager[3]
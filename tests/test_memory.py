@@ -0,0 +1,61 @@
+from sim import Key, Simulator, compile_serpent
+from storage_view import CompactStorageView, StorageView
+
+import logging
+
+
+class TestMemory(object):
+
+    ALICE = Key('cow')
+    BOB = Key('cat')
+
+    @classmethod
+    def setup_class(cls):
+        logging.disable(logging.INFO)
+        cls.code = compile_serpent('examples/mutuala.se')
+
+    def setup_method(self, method):
+        self.sim = Simulator({self.ALICE.address: 10**18, self.BOB.address: 10**18}, compact_storage=True)
+        self.contract = self.sim.load_contract(self.ALICE, self.code, gas=100000)
+
+    def test_compact_view_matches(self):
+        view = self.sim.storage(self.contract)
+        assert isinstance(view, CompactStorageView)
+        len(view)  # built before the transactions, so it has to follow their updates
+        for n in range(1, 6):
+            self.sim.tx(self.ALICE, self.contract, 0, ['pay', '%040x' % n, 1000], gas=100000)
+
+        reference = StorageView(self.sim, self.contract)
+        assert list(view.items()) == list(reference.items())
+        assert len(view) == len(reference)
+        assert view[2**160 - 1] == 6
+        assert view.get_many([2**160 + 1, 2**160 + 5]) == [1, 5]
+        assert view.range(2**160, 2**161, offset=1, limit=2) == reference.range(2**160, 2**161, offset=1, limit=2)
+        assert 2**160 + 5 in view and 2**160 + 6 not in view
+        assert view.size() < reference.size()
+
+    def test_compact_view_deletes(self):
+        view = self.sim.storage(self.contract)
+        keys = list(view)
+        view.update({keys[0]: 0, 7: 70})
+        view.update({keys[1]: 5})
+        assert len(view.pending) == 3  # merged on the next access
+        assert 7 in view and keys[0] not in view
+        assert list(view) == sorted([7] + keys[1:])
+        assert view[keys[1]] == 5 and view[7] == 70
+
+    def test_memory_report(self):
+        self.sim.tx(self.ALICE, self.contract, 0, ['pay', self.BOB.address, 1000], gas=100000)
+        view = self.sim.storage(self.contract)
+        report = self.sim.memory_report()
+
+        account = report['accounts'][self.contract]
+        assert account['storage_slots'] == len(view)
+        assert account['storage_nodes'] > 0 and account['storage_bytes'] > 0
+        assert account['code_bytes'] > 0
+        assert report['accounts'][self.BOB.address]['storage_slots'] == 0
+
+        assert report['storage']['slots'] == account['storage_slots']
+        assert report['state_trie']['nodes'] > 0
+        assert report['code']['bytes'] == account['code_bytes']
+        assert report['memory']['views'] == view.size()
@@ -32,10 +32,11 @@ class TestMutuala(object):
         cls.code = compile_serpent('examples/mutuala.se')
         cls.sim = Simulator({cls.ALICE.address: 10**18,
                              cls.BOB.address: 10**18})
+        cls.contract = cls.sim.load_contract(cls.ALICE, cls.code, gas=100000)
+        cls.snapshot = cls.sim.snapshot()
 
     def setup_method(self, method):
-        self.sim.reset()
-        self.contract = self.sim.load_contract(self.ALICE, self.code, gas=100000)
+        self.sim.revert(self.snapshot)
 
     def get_commons_balance(self):
         return self.sim.get_storage_data(self.contract, coerce_to_bytes(42))
@@ -50,11 +51,9 @@ class TestMutuala(object):
         return self.sim.get_storage_data(self.contract, coerce_to_bytes(int(address, 16) + 2**161 + 2))
 
     def get_account_list(self):
-        nr_accounts = self.sim.get_storage_data(self.contract, coerce_to_bytes(2**160-1))
-        accounts = []
-        for idx in range(nr_accounts):
-            accounts.append(coerce_addr_to_hex(self.sim.get_storage_data(self.contract, coerce_to_bytes(2**160 + idx))))
-        return accounts
+        storage = self.sim.storage(self.contract)
+        nr_accounts = storage[2**160-1]
+        return [coerce_addr_to_hex(account) for account in storage.get_many([2**160 + idx for idx in range(nr_accounts)])]
 
     def get_proposal_id(self, proposal):
         return big_endian_to_int(sha3(zpad(proposal, 32)))
@@ -72,11 +71,9 @@ class TestMutuala(object):
         return self.sim.get_storage_data(self.contract, coerce_to_bytes(proposal_id + 2**163 + 2))
 
     def get_proposal_list(self):
-        nr_proposals = self.sim.get_storage_data(self.contract, coerce_to_bytes(2**162-1))
-        proposals = []
-        for idx in range(nr_proposals):
-            proposals.append(coerce_addr_to_hex(self.sim.get_storage_data(self.contract, coerce_to_bytes(2**162 + idx))))
-        return proposals
+        storage = self.sim.storage(self.contract)
+        nr_proposals = storage[2**162-1]
+        return [coerce_addr_to_hex(proposal) for proposal in storage.get_many([2**162 + idx for idx in range(nr_proposals)])]
 
     def test_creation(self):
         assert self.get_account_list() == [self.ALICE.address]
@@ -87,6 +84,11 @@ class TestMutuala(object):
         ans = self.sim.tx(self.ALICE, self.contract, 0, ["balance", self.ALICE.address])
         assert result(ans) == [10**12]
 
+    def test_alice_balance_call(self):
+        ans = self.sim.call(self.ALICE, self.contract, ["balance", self.ALICE.address])
+        assert result(ans) == [10**12]
+        assert self.sim.nonce[self.ALICE] == 1
+
     def test_alice_pay_to_bob(self):
         ans = self.sim.tx(self.ALICE, self.contract, 0, ["pay", self.BOB.address, 1000])
         assert result(ans) == []
@@ -162,6 +164,22 @@ class TestMutuala(object):
 
         assert self.get_commons_balance() == 4107274070
 
+    def test_tick_bulk_loaded_accounts(self):
+        # account records take 3 slots each, so the addresses are spaced 3 apart
+        accounts = ['%040x' % (3 * n) for n in range(1, 6)]
+        storage = {2**160-1: 6}
+        for idx, account in enumerate(accounts, 1):
+            storage[2**160 + idx] = int(account, 16)
+            storage[2**161 + int(account, 16)] = 10**9
+            storage[2**161 + int(account, 16) + 1] = 1388534400
+        self.sim.load_state({self.contract: {'storage': storage}})
+        assert self.get_account_list() == [self.ALICE.address] + accounts
+
+        self.sim.genesis.timestamp += 30 * 86400
+        ans = self.sim.tx(self.ALICE, self.contract, 0, ["tick"], gas=100000)
+        assert result(ans) == [6]
+        assert self.get_account_balance(accounts[0]) == 10**9 - 30 * (10**9 / 7305)
+
     def test_hash(self):
         proposal_id_bob = self.get_proposal_id("grant to bob")
         assert proposal_id_bob == 82884732143192300288868108433691753839884641754571232824914642588078699974444
@@ -283,3 +301,9 @@ class TestMutuala(object):
         assert self.get_proposal_recipient("grant to bob") == '0000000000000000000000000000000000000000'
         assert self.get_proposal_amount("grant to bob") == 0
         assert self.get_proposal_votes("grant to bob") == 0
+
+    def test_suicide_drops_storage_view(self):
+        assert self.get_account_list() == [self.ALICE.address]
+        self.sim.tx(self.ALICE, self.contract, 0, ["suicide"])
+        assert self.sim.genesis.get_code(self.contract) == ''
+        assert len(self.sim.storage(self.contract)) == 0
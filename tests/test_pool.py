@@ -0,0 +1,24 @@
+from sim import Key, compile_serpent
+from pool import SimulatorPool
+
+ALICE = Key('cow')
+BOB = Key('cat')
+
+
+def deploy(sim):
+    return sim.load_contract(ALICE, compile_serpent('examples/subcurrency.se'))
+
+
+def transfer(sim, contract, amount):
+    assert sim.tx(ALICE, contract, 0, [BOB.address, amount]) == [1]
+    return sim.get_storage_data(contract, BOB.address)
+
+
+class TestSimulatorPool(object):
+
+    def test_map(self):
+        with SimulatorPool({ALICE.address: 10**18}, setup=deploy, processes=2) as pool:
+            # every scenario starts from the state right after deploy
+            assert pool.map(transfer, [1, 10, 100, 1000]) == [1, 10, 100, 1000]
+            assert sorted(pool.imap_unordered(transfer, [5, 50])) == [5, 50]
+        assert pool.sim.get_storage_data(pool.context, BOB.address) == 0
@@ -0,0 +1,50 @@
+from sim import Key, Simulator, compile_serpent
+from profiler import Profiler
+from pyethereum import processblock
+
+import json
+
+
+class TestProfiler(object):
+
+    ALICE = Key('cow')
+    BOB = Key('cat')
+
+    @classmethod
+    def setup_class(cls):
+        cls.code = compile_serpent('examples/subcurrency.se')
+        cls.sim = Simulator({cls.ALICE.address: 10**18})
+        cls.contract = cls.sim.load_contract(cls.ALICE, cls.code)
+        cls.snapshot = cls.sim.snapshot()
+
+    def setup_method(self, method):
+        self.sim.revert(self.snapshot)
+
+    def test_profile_tx(self):
+        apply_op = processblock.apply_op
+        with self.sim.hook(Profiler()) as profiler:
+            assert self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000]) == [1]
+        assert processblock.apply_op is apply_op
+
+        assert profiler.ops['SSTORE'][0] == 2
+        assert profiler.ops['RETURN'][0] == 1
+        assert all(row['contract'] == self.contract for row in profiler.to_dict()['pcs'])
+
+        profile = json.loads(profiler.to_json())
+        assert profile['opcodes'][0]['gas'] == max(gas for (_, gas, _) in profiler.ops.values())
+        assert 'SSTORE' in profiler.report()
+
+        # disabled again outside the with block
+        self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000])
+        assert profiler.ops['RETURN'][0] == 1
+
+    def test_source_map(self):
+        profiler = Profiler()
+        profiler.map_source(self.contract, {0: 4})
+        self.sim.hooks.append(profiler)
+        try:
+            self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000])
+        finally:
+            self.sim.hooks.remove(profiler)
+        rows = [row for row in profiler.to_dict()['pcs'] if row['pc'] == 0]
+        assert rows[0]['line'] == 4
@@ -0,0 +1,97 @@
+from sim import Key, Simulator, compile_serpent
+from replay import Recorder, Replayer, read_log
+import state_image
+
+import logging
+import pytest
+
+STORE = """
+contract.storage[msg.data[0]] = msg.data[1]
+return(1)
+"""
+
+# the same as STORE except for what key 7 ends up storing
+STORE_STATE_CHANGED = """
+if msg.data[0] == 7:
+    contract.storage[msg.data[0]] = msg.data[1] + 1
+else:
+    contract.storage[msg.data[0]] = msg.data[1]
+return(1)
+"""
+
+# the same as STORE except for what a store to key 7 returns
+STORE_RESULT_CHANGED = """
+contract.storage[msg.data[0]] = msg.data[1]
+if msg.data[0] == 7:
+    return(2)
+return(1)
+"""
+
+
+class TestReplay(object):
+
+    ALICE = Key('cow')
+    BOB = Key('cat')
+
+    @classmethod
+    def setup_class(cls):
+        logging.disable(logging.INFO)
+
+    def compile(self, tmpdir, name, source):
+        filename = tmpdir.join(name)
+        filename.write(source)
+        return compile_serpent(str(filename))
+
+    def record(self, tmpdir, sim=None, name='session.log'):
+        sim = sim or Simulator({self.ALICE.address: 10**18, self.BOB.address: 10**18})
+        path = str(tmpdir.join(name))
+        with Recorder(sim, path, checkpoint_interval=4):
+            contract = sim.load_contract(self.ALICE, self.compile(tmpdir, 'store.se', STORE))
+            for key in range(10):
+                sim.genesis.timestamp += 60
+                sim.tx(self.ALICE if key % 2 else self.BOB, contract, 0, [key, key * 100])
+        return path
+
+    def test_log(self, tmpdir):
+        log = read_log(self.record(tmpdir, name='session.log.gz'))
+        assert [entry[0] for entry in log].count('tx') == 10
+        assert [entry[0] for entry in log].count('checkpoint') == 3
+        assert log[1][0] == 'create'
+
+    def test_unrecorded_changes_refused(self, tmpdir):
+        sim = Simulator({self.ALICE.address: 10**18, self.BOB.address: 10**18})
+        snapshot = sim.snapshot()
+        with Recorder(sim, str(tmpdir.join('session.log'))):
+            with pytest.raises(RuntimeError):
+                sim.revert(snapshot)
+            with pytest.raises(RuntimeError):
+                sim.load_state({self.BOB.address: {'balance': 1}})
+        sim.revert(snapshot)
+
+    def test_replay_matches(self, tmpdir):
+        assert Replayer(self.record(tmpdir)).run() is None
+
+    def test_replay_from_image(self, tmpdir):
+        sim = Simulator({self.ALICE.address: 10**18, self.BOB.address: 10**18})
+        sim.tx(self.ALICE, self.BOB.address, 1000, [])
+        path = self.record(tmpdir, sim)
+        assert read_log(path)[0][5] == path + '.image'
+        assert Replayer(path).run() is None
+        # the image is closed and the database restored once the replay is done
+        assert state_image.layers == [] and state_image.writes is None
+
+    def test_result_divergence(self, tmpdir):
+        path = self.record(tmpdir)
+        original = self.compile(tmpdir, 'store.se', STORE)
+        changed = self.compile(tmpdir, 'changed.se', STORE_RESULT_CHANGED)
+        divergence = Replayer(path, substitute={original: changed}).run()
+        assert (divergence.kind, divergence.index) == ('result', 8)
+        assert (divergence.expected, divergence.actual) == ([1], [2])
+
+    def test_bisects_state_divergence(self, tmpdir):
+        path = self.record(tmpdir)
+        original = self.compile(tmpdir, 'store.se', STORE)
+        changed = self.compile(tmpdir, 'changed.se', STORE_STATE_CHANGED)
+        divergence = Replayer(path, substitute={original: changed}).run()
+        assert (divergence.kind, divergence.index, divergence.last) == ('state', 8, None)
+        assert divergence.expected != divergence.actual
@@ -0,0 +1,81 @@
+from sim import Key, Simulator, compile_serpent
+from rpc import Client, RPCError, Server, METHOD_NOT_FOUND, PARSE_ERROR, load_test
+
+import logging
+import pytest
+
+
+class TestRPC(object):
+
+    ALICE = Key('cow')
+    BOB = Key('cat')
+
+    @classmethod
+    def setup_class(cls):
+        logging.disable(logging.INFO)
+        cls.code = compile_serpent('examples/subcurrency.se').encode('hex')
+
+    def setup_method(self, method):
+        self.sim = Simulator({self.ALICE.address: 10**18, self.BOB.address: 10**18}, signed=False)
+        self.server = Server(self.sim)
+        self.client = Client(self.server.address)
+        self.contract = self.client.request('sim_deploy', 'cow', self.code)
+
+    def teardown_method(self, method):
+        self.client.close()
+        self.server.close()
+
+    def test_send_and_read(self):
+        assert self.client.request('sim_send', 'cow', self.contract, 0, [self.BOB.address, 1000]) == [1]
+        assert self.client.request('sim_call', 'cat', self.contract, [self.BOB.address]) == [1000]
+        assert self.client.request('sim_storage', self.contract, self.BOB.address) == 1000
+        assert self.client.request('sim_balance', self.BOB.address) == 10**18
+        assert self.sim.get_storage_data(self.contract, self.ALICE.address) == 999000
+
+    def test_deploy_after_failed_deploy(self):
+        # enough gas to start the transaction but not to run the contract's init
+        with pytest.raises(RPCError):
+            self.client.request('sim_deploy', 'cow', self.code, 0, 510 + 5 * len(self.code) // 2)
+        contract = self.client.request('sim_deploy', 'cow', self.code)
+        assert contract != self.contract
+        assert self.client.request('sim_send', 'cow', contract, 0, [self.BOB.address, 1000]) == [1]
+
+    def test_time_and_blocks(self):
+        timestamp = self.sim.genesis.timestamp
+        assert self.client.request('sim_advanceTime', 3600) == timestamp + 3600
+        assert self.client.request('sim_mine', 2, 60) == self.sim.genesis.number == 2
+        assert self.sim.genesis.timestamp == timestamp + 3720
+
+    def test_pipelining(self):
+        ids = [self.client.send('sim_send', 'cow', self.contract, 0, [self.BOB.address, 1]) for _ in range(10)]
+        self.client.flush()
+        responses = [self.client.receive() for _ in ids]
+        assert sorted(response['id'] for response in responses) == ids
+        assert all(response['result'] == [1] for response in responses)
+        assert self.client.request('sim_call', 'cow', self.contract, [self.BOB.address]) == [10]
+
+    def test_batch(self):
+        results = self.client.batch([('sim_send', ['cow', self.contract, 0, [self.BOB.address, 5]]),
+                                     ('sim_mine', []),
+                                     ('sim_balance', [self.BOB.address])])
+        assert results == [[1], 1, 10**18]
+
+    def test_errors(self):
+        with pytest.raises(RPCError) as e:
+            self.client.request('sim_unknown')
+        assert e.value.code == METHOD_NOT_FOUND
+
+        self.client.wfile.write('{not json\n')
+        self.client.flush()
+        assert self.client.receive()['error']['code'] == PARSE_ERROR
+
+    def test_load_test(self):
+        stats = load_test(self.server.address, 'sim_call', ['cow', self.contract, [self.ALICE.address]],
+                          requests=50, connections=2, depth=4)
+        assert stats['requests'] == 50
+        assert 0 < stats['p50'] <= stats['p90'] <= stats['p99'] <= stats['max']
+
+    def test_load_test_without_requests(self):
+        stats = load_test(self.server.address, 'sim_call', ['cow', self.contract, [self.ALICE.address]], requests=0)
+        assert stats['requests'] == 0
+        assert stats['p50'] is None and stats['max'] is None
@@ -0,0 +1,26 @@
+from scaling import analyze, breaking_point, fit
+
+
+class TestScaling(object):
+
+    def test_fit_linear(self):
+        model, a, b = fit([1, 10, 50, 100], [1000 + 300 * n for n in [1, 10, 50, 100]])
+        assert model == 'O(n)'
+        assert round(a) == 1000 and round(b) == 300
+
+    def test_fit_constant(self):
+        assert fit([1, 10, 100], [500, 500, 500]) == ('O(1)', 500.0, 0.0)
+
+    def test_fit_quadratic(self):
+        assert fit([1, 5, 10, 20, 40], [7 * n * n for n in [1, 5, 10, 20, 40]])[0] == 'O(n^2)'
+
+    def test_breaking_point(self):
+        # 1000 + 300 * n > 10^6 from n = 3331 on
+        assert breaking_point('O(n)', 1000, 300, 10**6) == 3331
+        assert breaking_point('O(1)', 500, 0, 10**6) is None
+
+    def test_analyze_skips_failed_points(self):
+        results = [{'n': n, 'gas': 1000 + 300 * n, 'time': 0.001 * n, 'ok': True} for n in [1, 10, 100]]
+        results.append({'n': 5000, 'gas': 10**6, 'time': 5.0, 'ok': False})
+        (gas_model, _, _), (time_model, _, _), limit = analyze(results, 10**6)
+        assert (gas_model, time_model, limit) == ('O(n)', 'O(n)', 3331)
@@ -0,0 +1,182 @@
+from sim import Key, Simulator, TransactionFailed, compile_serpent
+import state_image
+
+import pytest
+
+
+class TestSimulator(object):
+
+    ALICE = Key('cow')
+    BOB = Key('cat')
+
+    @classmethod
+    def setup_class(cls):
+        cls.code = compile_serpent('examples/subcurrency.se')
+        cls.sim = Simulator({cls.ALICE.address: 10**18,
+                             cls.BOB.address: 10**18})
+        cls.contract = cls.sim.load_contract(cls.ALICE, cls.code)
+        cls.snapshot = cls.sim.snapshot()
+
+    def setup_method(self, method):
+        self.sim.revert(self.snapshot)
+
+    def test_revert(self):
+        ans = self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000])
+        assert ans == [1]
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 1000
+
+        self.sim.revert(self.snapshot)
+        assert self.sim.get_storage_data(self.contract, self.ALICE.address) == 1000000
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 0
+
+        # nonces are rolled back as well, so the same transaction applies again
+        ans = self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000])
+        assert ans == [1]
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 1000
+
+    def test_nested_snapshots(self):
+        self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000])
+        outer = self.sim.snapshot()
+        self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 2000])
+        inner = self.sim.snapshot()
+        self.sim.tx(self.BOB, self.contract, 0, [self.ALICE.address, 3000])
+        self.sim.genesis.timestamp += 86400
+
+        self.sim.revert(inner)
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 3000
+        assert self.sim.genesis.timestamp == 1388534400
+
+        self.sim.revert(outer)
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 1000
+        assert len(self.sim.snapshots) == outer + 1
+
+    def test_tx_batch(self):
+        calls = [(self.ALICE, self.contract, 0, [self.BOB.address, 100])] * 5
+        calls.append((self.BOB, self.contract, 0, [self.ALICE.address, 200]))
+        assert list(self.sim.tx_batch(calls)) == [[1]] * 6
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 300
+        assert self.sim.nonce[self.ALICE] == 6
+
+    def test_tx_stream_is_lazy(self):
+        calls = ((self.ALICE, self.contract, 0, [self.BOB.address, 1]) for _ in range(10))
+        results = self.sim.tx_stream(calls, chunk_size=3)
+        assert next(results) == [1]
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 1
+        assert len(list(results)) == 9
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 10
+
+    def test_tx_batch_errors(self):
+        calls = [(self.ALICE, self.contract, 0, [self.BOB.address, 100]),
+                 (self.ALICE, self.contract, 0, [self.BOB.address, 100], 10),  # below intrinsic gas
+                 (self.ALICE, self.contract, 0, [self.BOB.address, 100])]
+
+        with pytest.raises(TransactionFailed) as e:
+            list(self.sim.tx_batch(calls))
+        assert e.value.index == 1
+
+        self.sim.revert(self.snapshot)
+        results = list(self.sim.tx_batch(calls, errors='stop'))
+        assert len(results) == 2 and isinstance(results[1], TransactionFailed)
+
+        self.sim.revert(self.snapshot)
+        results = list(self.sim.tx_batch(calls, errors='collect'))
+        assert results[0] == [1] and results[2] == [1]
+        assert isinstance(results[1], TransactionFailed)
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 200
+
+    def test_unsigned(self):
+        sim = Simulator({self.ALICE.address: 10**18}, signed=False)
+        contract = sim.load_contract(self.ALICE, self.code)
+        assert contract == self.contract
+
+        assert sim.tx(self.ALICE, contract, 0, [self.BOB.address, 1000]) == [1]
+        assert self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000]) == [1]
+
+        # same gas, nonce and value accounting as a signed transaction
+        assert sim.get_storage_data(contract, self.BOB.address) == 1000
+        assert sim.genesis.get_nonce(self.ALICE.address) == self.sim.genesis.get_nonce(self.ALICE.address)
+        assert sim.genesis.get_balance(self.ALICE.address) == self.sim.genesis.get_balance(self.ALICE.address)
+
+    def test_call(self):
+        assert self.sim.call(self.ALICE, self.contract, [self.ALICE.address]) == [1000000]
+
+        # writes are discarded and no nonce is used
+        assert self.sim.call(self.ALICE, self.contract, [self.BOB.address, 1000]) == [1]
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 0
+        assert self.sim.nonce[self.ALICE] == 1
+        assert self.sim.genesis.get_nonce(self.ALICE.address) == 1
+
+    def test_call_frozen_state(self):
+        frozen = self.sim.freeze()
+        self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000])
+        assert self.sim.call(self.BOB, self.contract, [self.BOB.address], state_root=frozen) == [0]
+        assert self.sim.call(self.BOB, self.contract, [self.BOB.address]) == [1000]
+
+    def test_storage_view(self):
+        storage = self.sim.storage(self.contract)
+        assert list(storage.items()) == [(int(self.ALICE.address, 16), 1000000)]
+
+        self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000])
+        self.sim.tx(self.ALICE, self.contract, 0, [5, 10])
+        self.sim.tx(self.ALICE, self.contract, 0, [7, 20])
+        assert len(storage) == 4
+        assert storage[self.BOB.address] == 1000
+        assert storage.get_many([5, 6, 7]) == [10, 0, 20]
+        assert storage.range(0, 2**160) == [(5, 10), (7, 20)] + sorted([(int(self.ALICE.address, 16), 998970),
+                                                                        (int(self.BOB.address, 16), 1000)])
+        assert storage.range(5, 8, offset=1) == [(7, 20)]
+        assert storage.range(limit=1) == [(5, 10)]
+
+        self.sim.revert(self.snapshot)
+        assert len(storage) == 1
+
+    def test_load_state(self):
+        carol = '%040x' % 123
+        assert self.sim.load_state({carol: {'balance': 10**18, 'nonce': 3},
+                                    self.contract: {'storage': {carol: 500, 7: 20}}}) == 2
+        assert self.sim.genesis.get_balance(carol) == 10**18
+        assert self.sim.genesis.get_nonce(carol) == 3
+        assert self.sim.storage(self.contract).get_many([carol, 7]) == [500, 20]
+
+        ans = self.sim.tx(self.ALICE, self.contract, 0, [carol, 1000])
+        assert ans == [1]
+        assert self.sim.get_storage_data(self.contract, carol) == 1500
+
+    def test_load_state_nonce_of_new_key(self):
+        dave = Key('dog')
+        self.sim.load_state({dave.address: {'balance': 10**18, 'nonce': 5}})
+        assert self.sim.nonce[dave] == 5
+        assert self.sim.tx(dave, self.contract, 0, [self.BOB.address, 0]) == [1]
+        assert self.sim.genesis.get_nonce(dave.address) == 6
+
+    def test_load_state_files(self, tmpdir):
+        csv = tmpdir.join('state.csv')
+        csv.write('address,balance,nonce,code,slot,value\n'
+                  '%s,1000,,,,\n'
+                  '%s,,,,0x07,20\n' % ('11' * 20, self.contract))
+        jsonl = tmpdir.join('state.jsonl')
+        jsonl.write('{"address": "%s", "code": "0x600a", "storage": {"0x01": "0x02"}}\n' % ('22' * 20))
+
+        assert self.sim.load_state(str(csv)) == 2
+        assert self.sim.load_state(str(jsonl)) == 1
+        assert self.sim.genesis.get_balance('11' * 20) == 1000
+        assert self.sim.get_storage_data(self.contract, 7) == 20
+        assert self.sim.genesis.get_code('22' * 20) == '\x60\x0a'
+        assert self.sim.get_storage_data('22' * 20, 1) == 2
+
+    def test_image(self, tmpdir):
+        self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000])
+        self.sim.genesis.timestamp += 86400
+        image = str(tmpdir.join('state.img'))
+        assert self.sim.save_image(image) > 0
+
+        sim = Simulator({self.ALICE.address: 10**18, self.BOB.address: 10**18})
+        with sim.load_image(image, keys=[self.ALICE, self.BOB]):
+            assert sim.freeze() == self.sim.freeze()
+            assert sim.genesis.timestamp == self.sim.genesis.timestamp
+            assert sim.get_storage_dict(self.contract) == self.sim.get_storage_dict(self.contract)
+
+            assert sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000]) == [1]
+            assert sim.get_storage_data(self.contract, self.BOB.address) == 2000
+            assert self.sim.get_storage_data(self.contract, self.BOB.address) == 1000
+        assert state_image.layers == [] and state_image.writes is None
@@ -0,0 +1,67 @@
+from sim import Key, Simulator, compile_serpent
+from tracer import Tracer, JsonlWriter, BinaryWriter, read_jsonl, read_binary
+
+from StringIO import StringIO
+
+
+class TestTracer(object):
+
+    ALICE = Key('cow')
+    BOB = Key('cat')
+
+    @classmethod
+    def setup_class(cls):
+        cls.code = compile_serpent('examples/subcurrency.se')
+        cls.sim = Simulator({cls.ALICE.address: 10**18})
+        cls.contract = cls.sim.load_contract(cls.ALICE, cls.code)
+        cls.snapshot = cls.sim.snapshot()
+
+    def setup_method(self, method):
+        self.sim.revert(self.snapshot)
+
+    def transfer(self):
+        assert self.sim.tx(self.ALICE, self.contract, 0, [self.BOB.address, 1000]) == [1]
+
+    def test_trace(self):
+        steps = list(self.sim.trace(self.transfer))
+        assert steps[0]['pc'] == 0
+        assert all(step['contract'] == self.contract and step['depth'] == 0 for step in steps)
+        assert steps[-1]['op'] == 'RETURN'
+
+        writes = [step['storage'] for step in steps if step['op'] == 'SSTORE']
+        assert writes == [(int(self.ALICE.address, 16), 999000), (int(self.BOB.address, 16), 1000)]
+        assert self.sim.get_storage_data(self.contract, self.BOB.address) == 1000
+
+    def test_filters(self):
+        steps = list(self.sim.trace(self.transfer, opcodes=['SSTORE']))
+        assert [step['op'] for step in steps] == ['SSTORE', 'SSTORE']
+        assert list(self.sim.trace(self.transfer, contracts=['00' * 20])) == []
+
+    def test_short_stack(self):
+        class CompState(object):
+            pc = 0
+            gas = 0
+            stack = [1]
+
+        class Msg(object):
+            to = '00' * 20
+        steps = []
+        tracer = Tracer(steps.append)
+        tracer.before(None, Msg, '\x55', CompState, 0)
+        tracer.step(None, Msg, '\x55', 0, 0, CompState, 0, 0)
+        assert steps == [{'contract': '00' * 20, 'pc': 0, 'op': 'SSTORE', 'gas': 0, 'cost': 0, 'stack': 1, 'depth': 0}]
+
+    def test_writers(self):
+        jsonl, binary = StringIO(), StringIO()
+        with self.sim.hook(Tracer(JsonlWriter(jsonl))):
+            with self.sim.hook(Tracer(BinaryWriter(binary))):
+                self.transfer()
+
+        jsonl.seek(0)
+        binary.seek(0)
+        from_jsonl = list(read_jsonl(jsonl))
+        from_binary = list(read_binary(binary))
+        assert len(from_jsonl) == len(from_binary) > 0
+        for a, b in zip(from_jsonl, from_binary):
+            assert (a['pc'], a['op'], a['gas'], a['cost']) == (b['pc'], b['op'], b['gas'], b['cost'])
+            assert tuple(a.get('storage', ())) == tuple(b.get('storage', ()))
@@ -0,0 +1,101 @@
+import json
+import struct
+
+from pyethereum.opcodes import opcodes, reverse_opcodes
+
+from hooks import opcode_at
+
+
+# Simulator hook producing one record per executed op: contract, pc, opcode, gas before the op, gas cost,
+# stack size after the op and message call depth, plus the (key, value) written by SSTORE. Records are handed
+# to emit(record) as they are produced; nothing is kept. contracts, opcodes and max_depth filter the steps.
+class Tracer(object):
+
+    def __init__(self, emit, contracts=None, opcodes=None, max_depth=None):
+        self.emit = emit
+        self.contracts = set(contracts) if contracts is not None else None
+        self.opcodes = set(opcodes) if opcodes is not None else None
+        self.max_depth = max_depth
+        self.writes = []
+
+    def wanted(self, msg, op, depth):
+        return ((self.contracts is None or msg.to in self.contracts) and
+                (self.opcodes is None or op in self.opcodes) and
+                (self.max_depth is None or depth <= self.max_depth))
+
+    def before(self, block, msg, code, compustate, depth):
+        if opcode_at(code, compustate.pc) == 'SSTORE':
+            # with fewer than two items the VM fails the op on a stack underflow, and there is no write
+            stack = compustate.stack
+            self.writes.append((stack[-1], stack[-2]) if len(stack) >= 2 else None)
+
+    def step(self, block, msg, code, pc, gas, compustate, elapsed, depth):
+        op = opcode_at(code, pc)
+        write = self.writes.pop() if op == 'SSTORE' and self.writes else None
+        if not self.wanted(msg, op, depth):
+            return
+        record = {'contract': msg.to, 'pc': pc, 'op': op, 'gas': gas, 'cost': gas - compustate.gas,
+                  'stack': len(compustate.stack), 'depth': depth}
+        if write is not None:
+            record['storage'] = write
+        self.emit(record)
+
+
+class JsonlWriter(object):
+
+    def __init__(self, f):
+        self.f = f
+
+    def __call__(self, record):
+        self.f.write(json.dumps(record, separators=(',', ':')))
+        self.f.write('\n')
+
+
+def read_jsonl(f):
+    for line in f:
+        yield json.loads(line)
+
+
+# Fixed-size records: contract, pc, opcode, gas, cost, stack, depth, then a flag and the SSTORE key and value
+# as 32 byte big endian words.
+BINARY_RECORD = struct.Struct('>20sIB QqHH B32s32s')
+
+
+def word(value):
+    return ('%064x' % (value % 2**256)).decode('hex')
+
+
+class BinaryWriter(object):
+
+    def __init__(self, f):
+        self.f = f
+
+    def __call__(self, record):
+        key, value = record.get('storage', (0, 0))
+        self.f.write(BINARY_RECORD.pack((record['contract'] or '').decode('hex'), record['pc'],
+                                        reverse_opcodes.get(record['op'], 0xff), record['gas'], record['cost'],
+                                        record['stack'], record['depth'], 'storage' in record, word(key),
+                                        word(value)))
+
+
+def read_binary(f):
+    while True:
+        data = f.read(BINARY_RECORD.size)
+        if len(data) < BINARY_RECORD.size:
+            return
+        contract, pc, op, gas, cost, stack, depth, has_write, key, value = BINARY_RECORD.unpack(data)
+        record = {'contract': contract.encode('hex'), 'pc': pc, 'op': opcodes.get(op, ['INVALID'])[0],
+                  'gas': gas, 'cost': cost, 'stack': stack, 'depth': depth}
+        if has_write:
+            record['storage'] = (int(key.encode('hex'), 16), int(value.encode('hex'), 16))
+        yield record
+
+
+# Runs fn(*args) with a Tracer attached and returns its records as a list, once fn has returned. fn runs on the
+# calling thread, so the Simulator is never used by two threads at once; to keep a long trace out of memory,
+# attach a Tracer writing to a file with sim.hook() instead.
+def trace(sim, fn, *args, **filters):
+    records = []
+    with sim.hook(Tracer(records.append, **filters)):
+        fn(*args)
+    return records